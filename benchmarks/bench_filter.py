@@ -0,0 +1,79 @@
+"""Filter benchmark: the columnar filter vs the equivalent loop over Records.
+
+Usage: python benchmarks/bench_filter.py [size ...]
+"""
+
+import sys
+import time
+
+from synthetic import email_for, phone_for
+
+from classes import AddressBook, Record
+import columnar
+
+REPEAT = 20
+QUERIES = {
+    "month=4 !email": lambda record: (
+        record.birthday is not None
+        and int(record.birthday.value[3:5]) == 4
+        and record.email is None
+    ),
+    "phone^050": lambda record: any(
+        str(phone).startswith("050") for phone in record.phones
+    ),
+    "year<1985 address": lambda record: (
+        record.birthday is not None
+        and int(record.birthday.value[6:]) < 1985
+        and record.address is not None
+    ),
+}
+
+
+def make_book(size):
+    book = AddressBook()
+    for i in range(size):
+        record = Record(f"user{i}")
+        record.add_phone(phone_for(i))
+        if i % 7 == 0:
+            record.add_phone("050" + phone_for(i)[3:])
+        if i % 3:
+            record.add_email(email_for(i))
+        if i % 2:
+            record.add_address(f"{i} Main Street")
+        if i % 5:
+            record.add_birthday(f"{i % 28 + 1:02d}.{i % 12 + 1:02d}.{1960 + i % 40}")
+        book.add_record(record)
+    return book
+
+
+def timed(func):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        result = func()
+    return (time.perf_counter() - start) / REPEAT * 1e3, len(result)
+
+
+def main(sizes):
+    backend = "numpy" if columnar.numpy is not None else "array"
+    print(f"backend: {backend}")
+    print(f"{'records':>10} {'query':<20} {'filter':>12} {'loop':>12} {'matches':>8}")
+    for size in sizes:
+        book = make_book(size)
+        start = time.perf_counter()
+        book.filter("email")
+        build_ms = (time.perf_counter() - start) * 1e3
+        print(f"{size:>10} {'(build columns)':<20} {build_ms:>9.2f} ms")
+        for query, predicate in QUERIES.items():
+            filter_ms, matches = timed(lambda: book.filter(query))
+            loop_ms, expected = timed(
+                lambda: [r for r in book.data.values() if predicate(r)]
+            )
+            assert matches == expected, (query, matches, expected)
+            print(
+                f"{size:>10} {query:<20} {filter_ms:>9.2f} ms "
+                f"{loop_ms:>9.2f} ms {matches:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000])
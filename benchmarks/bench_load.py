@@ -0,0 +1,69 @@
+"""Load benchmark: streaming and lazy from_json vs json.load of the whole document,
+and opening the memory-mapped binary snapshot.
+
+Each loader runs in a fresh interpreter so peak RSS is measured in isolation.
+
+Usage: python benchmarks/bench_load.py [size ...]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+from synthetic import write_book_json
+from jsonstream import iter_records
+from snapshot import write_snapshot
+
+LOADERS = {
+    "stream": "book.from_json(path)",
+    "lazy": "book.from_json(path, lazy=True)",
+    "json.load": (
+        "import json\n"
+        "with open(path) as file:\n"
+        "    for record in json.load(file)['records']:\n"
+        "        book.add_record(book.record_from_dict(record))"
+    ),
+    "mmap": (
+        "from snapshot import MappedAddressBook\n"
+        "book = MappedAddressBook(path[: -len('.json')] + '.bin')"
+    ),
+}
+
+SCRIPT = """
+import resource, sys, time
+sys.path.insert(0, {src!r})
+from classes import AddressBook
+path = {path!r}
+book = AddressBook()
+start = time.perf_counter()
+{loader}
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def run(loader, path):
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+    script = SCRIPT.format(src=src, path=path, loader=loader)
+    output = subprocess.check_output([sys.executable, "-c", script], text=True)
+    elapsed, max_rss_kb = output.split()
+    return float(elapsed), int(max_rss_kb) / 1024
+
+
+def main(sizes):
+    print(f"{'records':>10} {'file MB':>8} {'loader':>10} {'seconds':>8} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"book-{size}.json")
+            write_book_json(path, size)
+            with open(path) as file:
+                write_snapshot(iter_records(file), path[: -len(".json")] + ".bin")
+            file_mb = os.path.getsize(path) / (1 << 20)
+            for name, loader in LOADERS.items():
+                elapsed, peak_mb = run(loader, path)
+                print(f"{size:>10} {file_mb:>8.1f} {name:>10} {elapsed:>8.2f} {peak_mb:>8.1f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 500_000, 1_000_000])
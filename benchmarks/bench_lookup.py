@@ -0,0 +1,42 @@
+"""Reverse lookup benchmark: indexed find_by_phone/find_by_email vs a full scan.
+
+Usage: python benchmarks/bench_lookup.py [size ...]
+"""
+
+import random
+import sys
+import time
+
+from synthetic import email_for, make_book, phone_for
+
+LOOKUPS = 1000
+
+
+def scan_by_phone(book, phone_number):
+    for record in book.data.values():
+        for phone in record.phones:
+            if str(phone.value) == phone_number:
+                return record
+    return None
+
+
+def timed(func, keys):
+    start = time.perf_counter()
+    for key in keys:
+        func(key)
+    return (time.perf_counter() - start) / len(keys) * 1e6
+
+
+def main(sizes):
+    print(f"{'records':>10} {'find_by_phone':>15} {'find_by_email':>15} {'scan':>15}")
+    for size in sizes:
+        book = make_book(size)
+        ids = [random.randrange(size) for _ in range(LOOKUPS)]
+        phone_us = timed(book.find_by_phone, [phone_for(i) for i in ids])
+        email_us = timed(book.find_by_email, [email_for(i) for i in ids])
+        scan_us = timed(lambda p: scan_by_phone(book, p), [phone_for(i) for i in ids[:20]])
+        print(f"{size:>10} {phone_us:>12.2f} us {email_us:>12.2f} us {scan_us:>12.2f} us")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
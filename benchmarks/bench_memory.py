@@ -0,0 +1,50 @@
+"""Memory benchmark: bytes per contact for a fully populated book.
+
+Run it against another checkout to compare, e.g. before/after a change:
+python benchmarks/bench_memory.py --src /path/to/other/src [size]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+SCRIPT = """
+import sys, tracemalloc
+sys.path.insert(0, {src!r})
+from classes import AddressBook, Record
+
+tracemalloc.start()
+book = AddressBook()
+for i in range({size}):
+    record = Record(f"user{{i}}")
+    record.add_phone(f"{{i:010d}}")
+    record.add_phone(f"{{i + 1:010d}}")
+    record.add_email(f"user{{i}}@example.com")
+    record.add_birthday(f"{{i % 28 + 1:02d}}.{{i % 12 + 1:02d}}.1990")
+    record.add_address(f"{{i}} Main Street")
+    for n in range(2):
+        note = record.add_note(f"note {{n}} about user{{i}}")
+        record.add_tag_to_note_by_id(note.id, ["work", f"t{{i % 50}}"])
+    book.add_record(record)
+current, _ = tracemalloc.get_traced_memory()
+print(current / {size})
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("size", nargs="?", type=int, default=100_000)
+    parser.add_argument(
+        "--src",
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"),
+    )
+    options = parser.parse_args()
+
+    script = SCRIPT.format(src=os.path.abspath(options.src), size=options.size)
+    output = subprocess.check_output([sys.executable, "-c", script], text=True)
+    print(f"{options.size} contacts: {float(output):.0f} bytes per contact")
+
+
+if __name__ == "__main__":
+    main()
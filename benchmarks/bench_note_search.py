@@ -0,0 +1,28 @@
+"""Book-wide note search benchmark over the inverted index.
+
+Usage: python benchmarks/bench_note_search.py [notes ...]
+"""
+
+import random
+import sys
+import time
+
+from synthetic import make_notes_book
+
+QUERIES = 200
+
+
+def main(sizes):
+    print(f"{'notes':>10} {'search-notes':>15}")
+    for size in sizes:
+        book = make_notes_book(size)
+        queries = [f"topic{random.randrange(1000)}" for _ in range(QUERIES)]
+        start = time.perf_counter()
+        for term in queries:
+            book.search_notes([term])
+        elapsed = (time.perf_counter() - start) / QUERIES * 1e3
+        print(f"{size:>10} {elapsed:>12.3f} ms")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000])
@@ -0,0 +1,192 @@
+"""Benchmark suite for the AddressBook and NoteBook hot paths.
+
+Every scale runs in a fresh interpreter, so peak memory is measured in
+isolation. Results are printed as JSON (one object per operation and
+scale) so they can be stored and compared across releases; a readable
+table goes to stderr.
+
+Usage: python benchmarks/suite.py [--scales N ...] [--output FILE]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic import email_for, phone_for, write_book_json
+
+from classes import AddressBook
+from handlers import COMMANDS
+
+SCALES = [1_000, 10_000, 100_000]
+LOOKUPS = 1000
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def summarize(operation, scale, latencies, peak_mb):
+    total = sum(latencies)
+    result = {
+        "operation": operation,
+        "scale": scale,
+        "calls": len(latencies),
+        "total_s": total,
+        "ops_per_s": len(latencies) / total if total else None,
+        "peak_rss_mb": peak_mb,
+    }
+    micros = sorted(latency * 1e6 for latency in latencies)
+    if len(micros) > 1:
+        cuts = statistics.quantiles(micros, n=100, method="inclusive")
+        result.update(p50_us=cuts[49], p90_us=cuts[89], p99_us=cuts[98])
+    else:
+        result.update(p50_us=micros[0], p90_us=micros[0], p99_us=micros[0])
+    result["max_us"] = micros[-1]
+    return result
+
+
+def measure(func, args_list):
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def consume(output):
+    for _ in output:
+        pass
+
+
+def run_scale(scale, repeat=3):
+    """Time every operation on a synthetic book of ``scale`` contacts."""
+    rng = random.Random(scale)
+    ids = [rng.randrange(scale) for _ in range(LOOKUPS)]
+    results = []
+
+    def record(operation, latencies):
+        results.append(summarize(operation, scale, latencies, peak_rss_mb()))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "book.json")
+        write_book_json(path, scale)
+
+        books = []
+
+        def load():
+            book = AddressBook()
+            book.from_json(path)
+            books.append(book)
+
+        record("from_json", measure(load, [()] * repeat))
+        book = books.pop()
+        books.clear()
+
+        out_path = os.path.join(tmp, "out.json")
+        record("to_json", measure(book.to_json, [(out_path,)] * repeat))
+
+    record("find", measure(book.find, [(f"user{i}",) for i in ids]))
+    record("find_by_phone", measure(book.find_by_phone, [(phone_for(i),) for i in ids]))
+    record("find_by_email", measure(book.find_by_email, [(email_for(i),) for i in ids]))
+
+    notebooks = [book.find(f"user{i}").notes for i in ids]
+    record(
+        "NoteBook.search",
+        measure(lambda notes: notes.search("lorem"), [(notes,) for notes in notebooks]),
+    )
+    record(
+        "find_note_by_tags",
+        measure(
+            lambda notes: notes.find_note_by_tags(["work"]),
+            [(notes,) for notes in notebooks],
+        ),
+    )
+    record(
+        "get_birthdays_for_n_days",
+        measure(book.get_birthdays_for_n_days, [(7,)] * 20),
+    )
+
+    show_all = COMMANDS["all"].handler
+    record("show_all", measure(lambda: consume(show_all([], book)), [()] * repeat))
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results):
+    print(
+        f"{'scale':>8} {'operation':<26} {'ops/s':>12} {'p50 us':>10} "
+        f"{'p99 us':>10} {'peak MB':>8}",
+        file=sys.stderr,
+    )
+    for result in results:
+        print(
+            f"{result['scale']:>8} {result['operation']:<26} "
+            f"{result['ops_per_s']:>12.1f} {result['p50_us']:>10.1f} "
+            f"{result['p99_us']:>10.1f} {result['peak_rss_mb']:>8.1f}",
+            file=sys.stderr,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="also write the JSON report here")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    options = parser.parse_args()
+
+    if options.worker:
+        json.dump(run_scale(options.worker, options.repeat), sys.stdout)
+        return
+
+    results = []
+    for scale in options.scales:
+        output = subprocess.check_output(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--worker",
+                str(scale),
+                "--repeat",
+                str(options.repeat),
+            ],
+            text=True,
+        )
+        results += json.loads(output)
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": results,
+    }
+    print_table(results)
+    print(json.dumps(report, indent=2))
+    if options.output:
+        with open(options.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
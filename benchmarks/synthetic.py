@@ -0,0 +1,67 @@
+"""Synthetic address book generator shared by the benchmark scripts."""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from classes import AddressBook, Record  # noqa: E402
+
+
+def phone_for(i):
+    return f"{i:010d}"
+
+
+def email_for(i):
+    return f"user{i}@example.com"
+
+
+def make_book(size):
+    book = AddressBook()
+    for i in range(size):
+        record = Record(f"user{i}")
+        record.add_phone(phone_for(i))
+        record.add_email(email_for(i))
+        book.add_record(record)
+    return book
+
+
+def write_book_json(path, size, notes_per_record=2):
+    """Write a book.json of ``size`` records without building the object graph."""
+    with open(path, "w") as file:
+        file.write('{"records": [')
+        for i in range(size):
+            if i:
+                file.write(", ")
+            file.write(
+                json.dumps(
+                    {
+                        "name": f"user{i}",
+                        "phones": [phone_for(i)],
+                        "email": email_for(i),
+                        "address": f"{i} Main Street",
+                        "birthday": f"{i % 28 + 1:02d}.{i % 12 + 1:02d}.1990",
+                        "notes": [
+                            {
+                                "id": n,
+                                "content": f"note {n} about user{i} lorem ipsum",
+                                "tags": ["work", f"t{i % 50}"],
+                            }
+                            for n in range(notes_per_record)
+                        ],
+                    }
+                )
+            )
+        file.write('], "journal_seq": 0}')
+
+
+def make_notes_book(notes, notes_per_record=10):
+    """A book with ``notes`` notes spread over records, ten per contact by default."""
+    book = AddressBook()
+    for i in range(notes // notes_per_record):
+        record = Record(f"user{i}")
+        for n in range(notes_per_record):
+            record.add_note(f"topic{(i + n) % 1000} meeting notes for user{i} item {n}")
+        book.add_record(record)
+    return book
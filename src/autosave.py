@@ -0,0 +1,118 @@
+import os
+import sys
+import threading
+
+from jsonstream import iter_records, open_json
+from snapshot import Snapshot
+
+
+def previous_payloads(snapshot_path, binary_path=None):
+    """Records of the last save: book.json, or the binary copy without it."""
+    if os.path.exists(snapshot_path):
+        with open_json(snapshot_path) as file:
+            yield from iter_records(file)
+    elif binary_path is not None and os.path.exists(binary_path):
+        snapshot = Snapshot(binary_path)
+        try:
+            for number in range(len(snapshot)):
+                yield snapshot.payload(number)
+        finally:
+            snapshot.close()
+
+
+def merged_payloads(snapshot_path, changes, binary_path=None):
+    """Payloads of the previous snapshot with ``changes`` applied.
+
+    ``changes`` maps the names changed since that snapshot to their new
+    payload, or to None if the contact was deleted. Untouched records are
+    streamed from the file, so the book itself is never read.
+    """
+    seen = set()
+    for payload in previous_payloads(snapshot_path, binary_path):
+        name = payload["name"]
+        seen.add(name)
+        if name in changes:
+            payload = changes[name]
+        if payload is not None:
+            yield payload
+    for name, payload in changes.items():
+        if name not in seen and payload is not None:
+            yield payload
+
+
+class AutoSaver(threading.Thread):
+    """Saves the book in the background every ``interval`` seconds.
+
+    Commands run while holding ``lock``. The saver only takes it to copy
+    the records changed since the last save (and to truncate the journal);
+    the untouched ones are streamed from the previous snapshot while the
+    prompt keeps accepting commands.
+
+    Code holding ``lock`` must not wait for a save, since the save needs
+    the lock too: it calls request() instead.
+    """
+
+    def __init__(self, book, journal, book_path, lock, interval=5.0):
+        super().__init__(name="autosave", daemon=True)
+        self.book = book
+        self.journal = journal
+        self.book_path = book_path
+        self.lock = lock
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.wakeup = threading.Event()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            if self.stopped.is_set():
+                return
+            try:
+                self.save()
+            except OSError as error:
+                print(f"Autosave failed: {error}", file=sys.stderr)
+
+    def request(self):
+        """Save as soon as possible instead of at the next interval."""
+        self.wakeup.set()
+
+    def save(self):
+        """Write the book if anything changed; returns whether it did.
+
+        Only called from the saver thread, or once it is stopped.
+        """
+        with self.lock:
+            if not self.book.dirty:
+                return False
+            journal_seq = self.book.journal_seq
+            dirty, self.book.dirty = self.book.dirty, {}
+            changes = {
+                name: (
+                    self.book.record_to_dict(self.book.data[name])
+                    if name in self.book.data
+                    else None
+                )
+                for name in dirty
+            }
+
+        def payloads():
+            return merged_payloads(self.book_path, changes, self.journal.binary_path)
+
+        try:
+            self.journal.save(payloads, journal_seq, self.book_path)
+        except OSError:
+            with self.lock:
+                self.book.dirty |= dirty
+            raise
+
+        with self.lock:
+            # Entries appended meanwhile are not in the snapshot yet
+            if self.book.journal_seq == journal_seq:
+                self.journal.truncate()
+        return True
+
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+        self.join()
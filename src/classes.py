@@ -2,19 +2,37 @@ import re
 import json
 from collections import UserDict
 from datetime import datetime
-from utils import get_birthdays_for_n_days
+from utils import birthday_key, get_birthdays_for_n_days
+from jsonstream import dump_records, iter_records, open_json
+from indexes import NameTrie, NoteTextIndex, TrigramIndex, postings_match
+from instrument import timed
 import os
+import sys
+
+EMAIL_PATTERN = re.compile(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$")
+BIRTHDAY_PATTERN = re.compile(r"\d{2}.\d{2}.\d{4}")
 
 
 class Field:
+    __slots__ = ()
+
     def __init__(self, value):
         self.value = value
 
     def __str__(self):
         return str(self.value)
 
+    @classmethod
+    def trusted(cls, value):
+        # Data loaded from disk was validated when it was first entered
+        field = cls.__new__(cls)
+        field.value = value
+        return field
+
 
 class Name(Field):
+    __slots__ = ("value",)
+
     def __init__(self, value):
         if not self.validate_name(value):
             raise ValueError("Invalid name")
@@ -25,11 +43,22 @@ class Name(Field):
 
 
 class Phone(Field):
+    # Always ten digits, so kept as an int and zero-padded back on read
+    __slots__ = ("number",)
+
     def __init__(self, value):
         if not self.validate_phone(value):
             raise ValueError("Invalid phone number")
         super().__init__(value)
 
+    @property
+    def value(self):
+        return f"{self.number:010d}"
+
+    @value.setter
+    def value(self, value):
+        self.number = int(value)
+
     def validate_phone(self, value):
         return len(str(value)) == 10 and str(value).isdigit()
 
@@ -38,6 +67,8 @@ class Phone(Field):
 
 
 class Email(Field):
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = None
 
@@ -45,15 +76,15 @@ class Email(Field):
             self.value = self.validate_email(value)
 
     def validate_email(self, email):
-        pattern = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"
-
-        if re.match(pattern, email):
+        if EMAIL_PATTERN.match(email):
             return email
         else:
             raise ValueError("Invalid email")
 
 
 class Birthday(Field):
+    __slots__ = ("value",)
+
     def __init__(self, birthday):
         self.value = None
 
@@ -61,13 +92,15 @@ class Birthday(Field):
             self.value = self.validate_birthday(birthday)
 
     def validate_birthday(self, birthday):
-        if not re.match(r"\d{2}.\d{2}.\d{4}", birthday):
+        if not BIRTHDAY_PATTERN.match(birthday):
             raise ValueError("Birthday must be in DD.MM.YYYY format")
 
         return datetime.strptime(birthday, "%d.%m.%Y").strftime("%d.%m.%Y")
 
 
 class Address:
+    __slots__ = ("address",)
+
     def __init__(self, address):
         self.address = " ".join(address) if type(address) == list else address
 
@@ -76,31 +109,45 @@ class Address:
 
 
 class Record:
+    __slots__ = ("name", "phones", "birthday", "notes", "address", "email", "book")
+
     def __init__(self, name, address=None, email=None):
         self.name = Name(name)
         self.phones = []
         self.birthday = None
-        self.notes = NoteBook()
+        self.notes = NoteBook(self)
         self.address = address
         self.email = None
+        self.book = None
         if email:
             self.add_email(email)
 
     def add_birthday(self, birthday):
         if birthday:
-            self.birthday = Birthday(birthday)
+            new_birthday = Birthday(birthday)
+            self._unindex()
+            self.birthday = new_birthday
+            self._index()
 
     def add_phone(self, phone):
         if phone:
-            self.phones.append(Phone(phone))
+            new_phone = Phone(phone)
+            self._unindex()
+            self.phones.append(new_phone)
+            self._index()
 
     def remove_phone(self, phone):
+        self._unindex()
         self.phones = [p for p in self.phones if str(p) != str(phone)]
+        self._index()
 
     def edit_phone(self, old_phone, new_phone):
         for i, phone in enumerate(self.phones):
             if str(phone) == str(old_phone):
-                self.phones[i] = Phone(new_phone)
+                replacement = Phone(new_phone)
+                self._unindex()
+                self.phones[i] = replacement
+                self._index()
                 break
 
     def find_phone(self, phone):
@@ -111,10 +158,14 @@ class Record:
 
     def add_address(self, address):
         if address:
+            self._unindex()
             self.address = Address(address)
+            self._index()
 
     def edit_address(self, new_address):
+        self._unindex()
         self.address = Address(new_address)
+        self._index()
         return "Address updated."
 
     def show_address(self):
@@ -122,11 +173,17 @@ class Record:
 
     def add_email(self, email):
         if email:
-            self.email = Email(email)
+            new_email = Email(email)
+            self._unindex()
+            self.email = new_email
+            self._index()
 
     def edit_email(self, new_email):
         if new_email:
-            self.email = Email(new_email)
+            replacement = Email(new_email)
+            self._unindex()
+            self.email = replacement
+            self._index()
             return "Email updated."
         else:
             return "Invalid email."
@@ -158,8 +215,18 @@ class Record:
     def remove_tag_from_note_by_id(self, note_id, tag):
         return self.notes.remove_tag_from_note(note_id, tag)
 
-    def find_notes_by_tags(self, tags):
-        return self.notes.find_note_by_tags(tags)
+    def find_notes_by_tags(self, tags, match_all=True):
+        return self.notes.find_note_by_tags(tags, match_all)
+
+    # Keeping the owning book's indexes (and storage) in sync
+    def _index(self):
+        if self.book is not None:
+            self.book.index_record(self)
+            self.book.mark_dirty(self.name.value)
+
+    def _unindex(self):
+        if self.book is not None:
+            self.book.unindex_record(self)
 
     def __str__(self):
         phones_str = "; ".join([str(phone.value) for phone in self.phones])
@@ -173,147 +240,402 @@ class Record:
         return f"Contact name: {self.name.value}, phones: {phones_str}, email: {email_str}{birthday_str}, address: {address_str}"
 
 
+@timed("to_json")
+def dump_book(path, payloads, journal_seq=0, compression=None):
+    """Write record payloads as a book.json document, optionally compressed.
+
+    Records are encoded and written one at a time, so saving never holds a
+    copy of the whole book as dicts or as one big string.
+    """
+    with open_json(path, "w", compression) as file:
+        dump_records(file, payloads, journal_seq=journal_seq)
+
+
 class AddressBook(UserDict):
+    def __init__(self):
+        super().__init__()
+        # phone/email -> {name: record}, so reverse lookups don't scan the book;
+        # records not hydrated yet are in there as their raw payload
+        self.phone_index = {}
+        self.email_index = {}
+        self.note_index = NoteTextIndex()
+        # tag -> {(name, note id)} across every contact
+        self.tag_index = {}
+        # (month, day) -> {name: record} birthday calendar, payloads included
+        self.birthday_index = {}
+        # Built on first prefix query, so lazy loading stays cheap
+        self.name_trie = None
+        # Likewise built on the first fuzzy search and the first filter
+        self.trigrams = None
+        self.columns = None
+        # Raw payloads loaded lazily stay in self.data until first access
+        self.unhydrated = 0
+        # Last journal entry already contained in the snapshot
+        self.journal_seq = 0
+        # Names changed since the last save, so clean books are not rewritten
+        # (a dict used as an ordered set, so new contacts keep their order)
+        self.dirty = {}
+
     def add_record(self, record):
-        self.data[record.name.value] = record
+        name = record.name.value
+        if name in self.data:
+            self.delete(name)
+        self.data[name] = record
+        record.book = self
+        self._index_all(record)
+        if self.name_trie is not None:
+            self.name_trie.insert(name)
+        self.mark_dirty(name)
 
     def find(self, name):
-        return self.data.get(name)
+        return self.get(name)
 
     def delete(self, name):
-        del self.data[name]
-
-    def get_birthdays_per_week(self):
-        return get_birthdays_for_n_days(dict(self.data), 7)
+        record = self.data.pop(name)
+        if self.name_trie is not None:
+            self.name_trie.remove(name)
+        self.mark_dirty(name)
+        if type(record) is dict:
+            self.unhydrated -= 1
+            self._unindex_payload(name, record)
+            return
+        self.unindex_record(record)
+        for note in record.notes.notes.values():
+            self.unindex_note(record, note)
+        record.book = None
+
+    def __getitem__(self, name):
+        record = self.data[name]
+        if type(record) is dict:
+            record = self._hydrate(name, record)
+        return record
+
+    def peek(self, name):
+        """Record of ``name`` to read once; an unhydrated one is decoded
+        into a throwaway copy instead of being kept in the book."""
+        record = self.data[name]
+        if type(record) is dict:
+            record = self.record_from_dict(record)
+        return record
+
+    def _hydrate(self, name, payload):
+        record = self.record_from_dict(payload)
+        self.data[name] = record
+        record.book = self
+        self._index_all(record)
+        self.unhydrated -= 1
+        return record
+
+    def hydrate_all(self):
+        if self.unhydrated:
+            for name in self.data:
+                self[name]
+
+    def mark_dirty(self, name):
+        self.dirty[name] = None
+
+    def index_record(self, record):
+        name = record.name.value
+        for phone in record.phones:
+            self.phone_index.setdefault(str(phone.value), {})[name] = record
+        if record.email and record.email.value:
+            self.email_index.setdefault(record.email.value, {})[name] = record
+        if record.birthday and record.birthday.value:
+            key = birthday_key(record.birthday.value)
+            self.birthday_index.setdefault(key, {})[name] = record
+        if self.trigrams is not None:
+            self.trigrams.add(name, self.search_fields(record))
+        if self.columns is not None:
+            self.columns.set(name, *self.column_fields(record))
+
+    def unindex_record(self, record):
+        name = record.name.value
+        for phone in record.phones:
+            self._drop_from_index(self.phone_index, str(phone.value), name)
+        if record.email and record.email.value:
+            self._drop_from_index(self.email_index, record.email.value, name)
+        if record.birthday and record.birthday.value:
+            key = birthday_key(record.birthday.value)
+            self._drop_from_index(self.birthday_index, key, name)
+        if self.trigrams is not None:
+            self.trigrams.remove(name)
+        if self.columns is not None:
+            self.columns.remove(name)
+
+    def _index_payload(self, name, payload):
+        for phone in payload.get("phones", ()):
+            self.phone_index.setdefault(phone, {})[name] = payload
+        if payload.get("email"):
+            self.email_index.setdefault(payload["email"], {})[name] = payload
+        if payload.get("birthday"):
+            key = birthday_key(payload["birthday"])
+            self.birthday_index.setdefault(key, {})[name] = payload
+
+    def _unindex_payload(self, name, payload):
+        for phone in payload.get("phones", ()):
+            self._drop_from_index(self.phone_index, phone, name)
+        if payload.get("email"):
+            self._drop_from_index(self.email_index, payload["email"], name)
+        if payload.get("birthday"):
+            key = birthday_key(payload["birthday"])
+            self._drop_from_index(self.birthday_index, key, name)
+
+    def _index_all(self, record):
+        self.index_record(record)
+        for note in record.notes.notes.values():
+            self.index_note(record, note)
+
+    def index_note(self, record, note):
+        self.note_index.add(record.name.value, note)
+        key = (record.name.value, note.id)
+        for tag in note.tags:
+            self.tag_index.setdefault(tag, set()).add(key)
+
+    def unindex_note(self, record, note):
+        self.note_index.remove(record.name.value, note)
+        key = (record.name.value, note.id)
+        for tag in note.tags:
+            keys = self.tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tag_index[tag]
+
+    def find_by_tags(self, tags, match_all=True):
+        """Notes of every contact carrying the tags, as (record, note) pairs."""
+        self.hydrate_all()
+        results = []
+        keys = postings_match(self.tag_index, set(tags), match_all)
+        for name, note_id in sorted(keys):
+            record = self.data[name]
+            results.append((record, record.notes.find_note_by_id(note_id)))
+        return results
+
+    def search_notes(self, terms, limit=20):
+        """Book-wide ranked note search: a list of (record, note) pairs."""
+        self.hydrate_all()
+        results = []
+        for score, (name, note_id) in self.note_index.search(terms, limit):
+            record = self.data[name]
+            results.append((record, record.notes.find_note_by_id(note_id)))
+        return results
+
+    def search(self, query, limit=10):
+        """Contacts whose name, phone, email or address fuzzily match."""
+        self.hydrate_all()
+        if self.trigrams is None:
+            self.trigrams = TrigramIndex()
+            for name, record in self.data.items():
+                self.trigrams.add(name, self.search_fields(record))
+        return [self.data[name] for name in self.trigrams.search(query, limit)]
+
+    @staticmethod
+    def search_fields(record):
+        return [
+            record.name.value,
+            *(str(phone) for phone in record.phones),
+            record.email.value if record.email else None,
+            str(record.address) if record.address else None,
+        ]
 
-    def find_by_email(self, email):
-        for record in self.data.values():
-            if record.email and record.email.value == email:
-                return record
-        return None
+    def filter(self, query):
+        """Contacts matching a filter query (see columnar.py for the syntax)."""
+        # Imported here: it loads NumPy when available
+        from columnar import ColumnStore, parse_filter
+
+        predicates = parse_filter(query)
+        self.hydrate_all()
+        if self.columns is None:
+            self.columns = ColumnStore()
+            for name, record in self.data.items():
+                self.columns.set(name, *self.column_fields(record))
+        return [self.data[name] for name in self.columns.filter(predicates)]
+
+    @staticmethod
+    def column_fields(record):
+        return (
+            [str(phone) for phone in record.phones],
+            record.email.value if record.email else None,
+            str(record.address) if record.address else None,
+            record.birthday.value if record.birthday else None,
+        )
 
-    def find_by_phone(self, phone_number):
-        for record in self.data.values():
-            for phone in record.phones:
-                if str(phone.value) == phone_number:
-                    return record
-        return None
+    def _drop_from_index(self, index, key, name):
+        bucket = index.get(key)
+        if bucket is None:
+            return
+        bucket.pop(name, None)
+        if not bucket:
+            del index[key]
 
-    def to_json(self, path):
-        dumped_json = json.dumps(
-            {
-                "records": [
-                    {
-                        "name": record.name.value,
-                        "phones": [str(phone) for phone in record.phones],
-                        "email": record.email.value if record.email else None,
-                        "address": str(record.address) if record.address else None,
-                        "birthday": (
-                            str(record.birthday.value) if record.birthday else None
-                        ),
-                        "notes": [note.__dict__() for note in record.notes.notes],
-                    }
-                    for record in self.data.values()
-                ]
-            }
-        )
+    def names_with_prefix(self, prefix):
+        """Lazily yield contact names starting with ``prefix``, sorted."""
+        if self.name_trie is None:
+            self.name_trie = NameTrie(self.data)
+        return self.name_trie.starting_with(prefix)
 
-        with open(path, "w") as file:
-            file.write(dumped_json)
+    def get_birthdays_per_week(self):
+        return self.get_birthdays_for_n_days(7)
 
-    def from_json(self, path):
-        if not os.path.exists(path):
-            return None
+    def get_birthdays_for_n_days(self, n_days):
+        return get_birthdays_for_n_days(self, n_days)
 
-        with open(path, "r+") as file:
-            data = json.load(file)
+    def birthdays_on(self, keys):
+        """Names of the contacts whose birthday falls in the (month, day) buckets."""
+        return [name for key in keys for name in self.birthday_index.get(key, ())]
 
-            for record in data.get("records"):
-                new_record = Record(record.get("name"))
+    def find_by_email(self, email):
+        records = self.email_index.get(email)
+        # Hydrates the match only, if it is still a raw payload
+        return self[next(iter(records))] if records else None
 
-                for phone in record.get("phones"):
-                    new_record.add_phone(phone)
+    def find_by_phone(self, phone_number):
+        records = self.phone_index.get(str(phone_number))
+        return self[next(iter(records))] if records else None
 
-                new_record.add_email(record.get("email"))
-                new_record.add_address(record.get("address"))
-                new_record.add_birthday(
-                    record.get("birthday") if record.get("birthday") else None
-                )
-                new_record.notes = NoteBook()
-                for note_data in record.get("notes"):
-                    new_note = new_record.add_note(note_data.get("content"))
-                    new_record.add_tag_to_note_by_id(
-                        new_note.id, note_data.get("tags", [])
-                    )
+    def record_payloads(self):
+        for record in self.data.values():
+            yield self.record_to_dict(record)
+
+    def to_json(self, path, compression=None):
+        dump_book(path, self.record_payloads(), self.journal_seq, compression)
+
+    @staticmethod
+    def record_to_dict(record):
+        if type(record) is dict:
+            # Never hydrated, so nothing changed since it was loaded
+            return record
+
+        return {
+            "name": record.name.value,
+            "phones": [str(phone) for phone in record.phones],
+            "email": record.email.value if record.email else None,
+            "address": str(record.address) if record.address else None,
+            "birthday": (str(record.birthday.value) if record.birthday else None),
+            "notes": [note.to_dict() for note in record.notes.notes.values()],
+        }
+
+    @timed("from_json")
+    def from_json(self, path, lazy=False):
+        if not os.path.exists(path):
+            return None
 
-                self.add_record(new_record)
+        # Records are decoded and added one at a time, so the parsed
+        # document is never held in memory as a whole
+        meta = {}
+        with open_json(path) as file:
+            for record in iter_records(file, meta):
+                if lazy:
+                    self.data[record.get("name")] = record
+                    self.unhydrated += 1
+                    self._index_payload(record.get("name"), record)
+                else:
+                    self.add_record(self.record_from_dict(record))
+                    # Same as on disk, so not a change to save
+                    self.dirty.pop(record.get("name"), None)
+
+        self.journal_seq = meta.get("journal_seq", 0)
+
+    @staticmethod
+    def record_from_dict(record):
+        new_record = Record(record.get("name"))
+        new_record.phones = [Phone.trusted(phone) for phone in record.get("phones")]
+
+        if record.get("email"):
+            new_record.email = Email.trusted(record.get("email"))
+        if record.get("address"):
+            new_record.address = Address(record.get("address"))
+        if record.get("birthday"):
+            new_record.birthday = Birthday.trusted(record.get("birthday"))
+
+        for note_data in record.get("notes"):
+            new_record.notes.create_note(
+                note_data.get("content"), note_data.get("tags", []), note_data.get("id")
+            )
+
+        return new_record
 
 
 # Notes
 class Note:
-    note_id = 0
+    __slots__ = ("content", "id", "tags")
 
-    def __init__(self, content):
+    def __init__(self, content, note_id):
         self.content = " ".join(content) if type(content) == list else content
-        self.id = Note.note_id
-        self.tags = []
-        Note.note_id += 1
+        self.id = note_id
+        self.tags = set()
 
     def edit(self, new_content):
         self.content = " ".join(new_content)
 
     def add_tag(self, tags):
-        self.tags.extend(tags)
+        # Tags repeat across many notes; share one string object per tag
+        self.tags.update(sys.intern(tag) for tag in tags)
 
     def remove_tag(self, tag):
-        self.tags = [t for t in self.tags if t != tag]
+        self.tags.discard(tag)
 
     def __str__(self):
-        tags_str = ", ".join(self.tags)
+        tags_str = ", ".join(sorted(self.tags))
         return f"[{self.id}]: {self.content}\n\nTags: {tags_str}"
 
     def __repr__(self):
-        tags_str = ", ".join(self.tags)
+        tags_str = ", ".join(sorted(self.tags))
         return f"[{self.id}]: {self.content}\n\nTags: {tags_str}"
 
-    def __dict__(self):
-        return {"id": self.id, "content": self.content}
+    def to_dict(self):
+        return {"id": self.id, "content": self.content, "tags": sorted(self.tags)}
 
 
 class NoteBook:
-    def __init__(self):
-        self.notes = []
+    __slots__ = ("notes", "next_id", "record", "tag_index")
+
+    def __init__(self, record=None):
+        # note id -> Note, in creation order
+        self.notes = {}
+        self.next_id = 0
+        self.record = record
+        # tag -> ids of the notes carrying it
+        self.tag_index = {}
 
     # Notes
-    def create_note(self, content):
-        new_note = Note(content)
-        self.notes.append(new_note)
+    def create_note(self, content, tags=(), note_id=None):
+        # Ids loaded from disk are kept so they stay stable across restarts
+        if note_id is None:
+            note_id = self.next_id
+        self.next_id = max(self.next_id, note_id + 1)
+
+        new_note = Note(content, note_id)
+        new_note.add_tag(tags)
+        self.notes[note_id] = new_note
+        self._index(new_note)
         return new_note
 
     def edit_note(self, note_id, new_content):
         note = self.find_note_by_id(note_id)
 
         if note:
+            self._unindex(note)
             note.edit(new_content)
+            self._index(note)
             return "Note edited."
         return "Note not found."
 
     def delete_note(self, note_id):
-        for i, note in enumerate(self.notes):
-            if int(note.id) == int(note_id):
-                del self.notes[i]
-                return "Note deleted."
+        note = self.notes.pop(int(note_id), None)
+        if note:
+            self._unindex(note)
+            return "Note deleted."
         return "Note not found."
 
     def find_note_by_id(self, note_id):
-        for note in self.notes:
-            if int(note.id) == int(note_id):
-                return note
-        return None
+        return self.notes.get(int(note_id))
 
     def search(self, search_string):
         found_notes = [
-            note for note in self.notes if search_string.lower() in note.content.lower()
+            note
+            for note in self.notes.values()
+            if search_string.lower() in note.content.lower()
         ]
 
         return (
@@ -326,28 +648,41 @@ class NoteBook:
     def add_tag_to_note(self, note_id, tag):
         note = self.find_note_by_id(note_id)
         if note:
+            self._unindex(note)
             note.add_tag(tag)
+            self._index(note)
             return "Tag added."
         return "Note not found."
 
     def remove_tag_from_note(self, note_id, tag):
         note = self.find_note_by_id(note_id)
         if note:
+            self._unindex(note)
             note.remove_tag(tag)
+            self._index(note)
             return "Tag removed."
         return "Note not found."
 
-    def find_note_by_tags(self, tags):
-        found_notes = [note for note in self.notes if set(tags).issubset(note.tags)]
+    def find_note_by_tags(self, tags, match_all=True):
+        found_notes = [
+            self.find_note_by_id(note_id)
+            for note_id in sorted(self.find_note_ids_by_tags(tags, match_all))
+        ]
         return (
             "\n".join(str(note) for note in found_notes)
             if found_notes
             else "No notes found."
         )
 
+    def find_note_ids_by_tags(self, tags, match_all=True):
+        tags = set(tags)
+        if not tags:
+            return set(self.notes) if match_all else set()
+        return postings_match(self.tag_index, tags, match_all)
+
     # Dumping to JSON
     def to_json(self):
-        return json.dumps({"notes": [note.__dict__() for note in self.notes]})
+        return json.dumps({"notes": [note.to_dict() for note in self.notes.values()]})
 
     # Reading from JSON
     def from_json(self, path):
@@ -359,5 +694,24 @@ class NoteBook:
                     new_note = self.create_note(note_data.get("content"))
                     self.add_tag_to_note(new_note.id, note_data.get("tags"))
 
+    # Keeping the tag index and the owning book's indexes (and storage) in sync
+    def _index(self, note):
+        for tag in note.tags:
+            self.tag_index.setdefault(tag, set()).add(note.id)
+        if self.record is not None and self.record.book is not None:
+            self.record.book.index_note(self.record, note)
+            self.record.book.mark_dirty(self.record.name.value)
+
+    def _unindex(self, note):
+        for tag in note.tags:
+            ids = self.tag_index.get(tag)
+            if ids is not None:
+                ids.discard(note.id)
+                if not ids:
+                    del self.tag_index[tag]
+        if self.record is not None and self.record.book is not None:
+            self.record.book.unindex_note(self.record, note)
+            self.record.book.mark_dirty(self.record.name.value)
+
     def __str__(self):
-        return "\n".join(str(note) for note in self.notes)
+        return "\n".join(str(note) for note in self.notes.values())
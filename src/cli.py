@@ -1,20 +1,29 @@
 import sys
 import readline
+from itertools import islice
 from os import environ
 
+from indexes import NameTrie
+
 
 class Autocompleter(object):
+    # readline asks for every match; don't walk a huge book for a short prefix
+    MAX_MATCHES = 100
 
-    def __init__(self, options):
-        self.options = sorted(options)
+    def __init__(self, options, book=None):
+        self.options = NameTrie(options)
+        self.book = book
 
     def complete(self, text, state):
         if state == 0:
-            if not text:
-                self.matches = self.options[:]
+            line = readline.get_line_buffer()[: readline.get_begidx()]
+            if not line.strip():
+                source = self.options.starting_with(text)
+            elif self.book is not None:
+                source = self.book.names_with_prefix(text)
             else:
-                self.matches = [s for s in self.options
-                                if s and s.startswith(text)]
+                source = ()
+            self.matches = list(islice(source, self.MAX_MATCHES))
 
         try:
             return self.matches[state]
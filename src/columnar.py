@@ -0,0 +1,244 @@
+"""Columnar mirror of the address book for vectorized filter queries.
+
+Every contact owns a row in a set of ``array`` columns; phones live in
+their own (number, row) columns since a contact can have several.
+With NumPy installed the columns are viewed as NumPy arrays (without
+copying) and each predicate is a boolean mask; without it the masks are
+built with C-level bytes operations and combined as bitsets.
+
+Filter syntax: whitespace-separated terms that must all hold.
+
+    month=3  day>=10  year<1990  born>=01.01.1990   birthday fields
+    phone^050  phone=0501234567                      any of the phones
+    email  !email  address  !address  birthday  !birthday
+"""
+
+import re
+from array import array
+from datetime import date, datetime
+from itertools import compress
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+PHONE_DIGITS = 10
+TERM_PATTERN = re.compile(r"(month|day|year|born|phone)(=|!=|<=|>=|<|>|\^)(\S+)")
+FLAG_PATTERN = re.compile(r"(!?)(email|address|birthday)")
+OPERATORS = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+# value.<method>(v) is v <op> value
+REFLECTED = {
+    "=": "__eq__",
+    "!=": "__ne__",
+    "<": "__gt__",
+    "<=": "__ge__",
+    ">": "__lt__",
+    ">=": "__le__",
+}
+
+
+def parse_filter(query):
+    """Turn the query into (column, operator, value) triples."""
+    predicates = []
+    for term in query.split():
+        if match := FLAG_PATTERN.fullmatch(term):
+            negated, column = match.groups()
+            predicates.append((f"has_{column}", "=", 0 if negated else 1))
+            continue
+
+        match = TERM_PATTERN.fullmatch(term)
+        if match is None:
+            raise ValueError(f"Invalid filter term {term!r}.")
+        field, op, value = match.groups()
+        if field == "phone":
+            predicates.append(phone_predicate(op, value))
+        elif op == "^":
+            raise ValueError(f"Prefix match only works on phones: {term!r}.")
+        elif field == "born":
+            born = datetime.strptime(value, "%d.%m.%Y").date().toordinal()
+            predicates += [("has_birthday", "=", 1), ("birthday", op, born)]
+        elif field == "year":
+            predicates += [("has_birthday", "=", 1), *year_predicates(op, int(value))]
+        else:
+            predicates += [("has_birthday", "=", 1), (field, op, int(value))]
+    return predicates
+
+
+def phone_predicate(op, value):
+    if not value.isdigit() or len(value) > PHONE_DIGITS:
+        raise ValueError(f"Invalid phone {value!r}.")
+    if op == "^":
+        # Phones are fixed-width, so a prefix is a range of numbers
+        scale = 10 ** (PHONE_DIGITS - len(value))
+        return ("phone", "range", (int(value) * scale, (int(value) + 1) * scale))
+    if op != "=":
+        raise ValueError("Phones can only be matched with = or ^.")
+    return ("phone", op, int(value))
+
+
+def year_predicates(op, year):
+    # A year is a range of ordinals
+    start, end = date(year, 1, 1).toordinal(), date(year + 1, 1, 1).toordinal()
+    if op == "=":
+        return [("birthday", ">=", start), ("birthday", "<", end)]
+    if op == "!=":
+        return [("birthday", "range_not", (start, end))]
+    bound = {"<": start, ">=": start, "<=": end, ">": end}[op]
+    return [("birthday", {"<=": "<", ">": ">="}.get(op, op), bound)]
+
+
+class ColumnStore:
+    def __init__(self):
+        self.names = []
+        self.rows = {}
+        self.alive = array("b")
+        self.has_email = array("b")
+        self.has_address = array("b")
+        self.has_birthday = array("b")
+        self.birthday = array("i")
+        self.month = array("b")
+        self.day = array("b")
+        # One entry per phone; removed phones get row -1
+        self.phone_numbers = array("q")
+        self.phone_rows = array("i")
+        self.phone_slots = {}
+        self.dead_phones = 0
+
+    def __len__(self):
+        return sum(self.alive)
+
+    def set(self, name, phones, email, address, birthday):
+        """Insert or update a contact; ``birthday`` is a DD.MM.YYYY string."""
+        row = self.rows.get(name)
+        if row is None:
+            row = self.rows[name] = len(self.names)
+            self.names.append(name)
+            for column in self._row_columns():
+                column.append(0)
+        else:
+            self._drop_phones(row)
+
+        born = None
+        if birthday:
+            day, month, year = birthday.split(".")
+            born = date(int(year), int(month), int(day))
+        self.alive[row] = 1
+        self.has_email[row] = bool(email)
+        self.has_address[row] = bool(address)
+        self.has_birthday[row] = born is not None
+        self.birthday[row] = born.toordinal() if born else 0
+        self.month[row] = born.month if born else 0
+        self.day[row] = born.day if born else 0
+
+        slots = self.phone_slots[row] = []
+        for phone in phones:
+            slots.append(len(self.phone_numbers))
+            self.phone_numbers.append(int(phone))
+            self.phone_rows.append(row)
+
+    def remove(self, name):
+        row = self.rows.get(name)
+        if row is not None:
+            self.alive[row] = 0
+            self._drop_phones(row)
+
+    def _row_columns(self):
+        return (
+            self.alive,
+            self.has_email,
+            self.has_address,
+            self.has_birthday,
+            self.birthday,
+            self.month,
+            self.day,
+        )
+
+    def _drop_phones(self, row):
+        for slot in self.phone_slots.pop(row, ()):
+            self.phone_rows[slot] = -1
+            self.dead_phones += 1
+        if self.dead_phones > len(self.phone_rows) // 2:
+            self._compact_phones()
+
+    def _compact_phones(self):
+        numbers, rows = array("q"), array("i")
+        self.phone_slots = {}
+        for number, row in zip(self.phone_numbers, self.phone_rows):
+            if row >= 0:
+                self.phone_slots.setdefault(row, []).append(len(numbers))
+                numbers.append(number)
+                rows.append(row)
+        self.phone_numbers, self.phone_rows = numbers, rows
+        self.dead_phones = 0
+
+    def filter(self, predicates):
+        """Names matching every predicate, in row order."""
+        if numpy is not None:
+            mask = numpy.frombuffer(self.alive, dtype=numpy.int8) == 1
+            for predicate in predicates:
+                mask &= self._numpy_mask(*predicate)
+            return [self.names[row] for row in numpy.flatnonzero(mask)]
+
+        # Masks are bytes of 0/1; read as big integers, AND works bytewise
+        size = len(self.names)
+        mask = int.from_bytes(bytes(self.alive), "big")
+        for predicate in predicates:
+            mask &= int.from_bytes(self._python_mask(*predicate), "big")
+        return list(compress(self.names, mask.to_bytes(size, "big")))
+
+    def _numpy_mask(self, column, op, value):
+        if column == "phone":
+            numbers = numpy.frombuffer(self.phone_numbers, dtype=numpy.int64)
+            owners = numpy.frombuffer(self.phone_rows, dtype=numpy.int32)
+            hits = self._numpy_compare(numbers, op, value) & (owners >= 0)
+            mask = numpy.zeros(len(self.names), dtype=bool)
+            mask[owners[hits]] = True
+            return mask
+
+        dtype = numpy.int32 if column == "birthday" else numpy.int8
+        values = numpy.frombuffer(getattr(self, column), dtype=dtype)
+        return self._numpy_compare(values, op, value)
+
+    @staticmethod
+    def _numpy_compare(values, op, value):
+        if op == "range":
+            return (values >= value[0]) & (values < value[1])
+        if op == "range_not":
+            return (values < value[0]) | (values >= value[1])
+        return OPERATORS[op](values, value)
+
+    def _python_mask(self, column, op, value):
+        if column == "phone":
+            mask = bytearray(len(self.names))
+            hits = self._python_compare(self.phone_numbers, op, value)
+            for row in compress(self.phone_rows, hits):
+                if row >= 0:
+                    mask[row] = 1
+            return mask
+
+        values = getattr(self, column)
+        if values.typecode == "b" and op in OPERATORS:
+            # Small values: one 256-entry lookup table, applied in C
+            compare = OPERATORS[op]
+            table = bytes(compare(v - 256 if v > 127 else v, value) for v in range(256))
+            return bytes(values).translate(table)
+        return self._python_compare(values, op, value)
+
+    @classmethod
+    def _python_compare(cls, values, op, value):
+        if op in ("range", "range_not"):
+            low = int.from_bytes(cls._python_compare(values, ">=", value[0]), "big")
+            high = int.from_bytes(cls._python_compare(values, "<", value[1]), "big")
+            if op == "range":
+                return (low & high).to_bytes(len(values), "big")
+            return (low ^ high).to_bytes(len(values), "big")
+        # The bound method of the constant is called from C for every value
+        return bytes(map(getattr(value, REFLECTED[op]), values))
@@ -1 +1,652 @@
-# in the future we will add user input handlers in this file
+from functools import cache
+from itertools import islice
+
+from instrument import STATS, timed
+
+
+# Color formatting for better user experience
+class Color:
+    BOLD = "\033[1m"
+    UNDERLINE = "\033[4m"
+    END = "\033[0m"
+    RED = "\033[91m"
+    GREEN = "\033[92m"
+    YELLOW = "\033[93m"
+    BLUE = "\033[94m"
+
+    @classmethod
+    def disable(cls):
+        # Plain output for scripts and pipes
+        for name in ("BOLD", "UNDERLINE", "END", "RED", "GREEN", "YELLOW", "BLUE"):
+            setattr(cls, name, "")
+
+
+class Failure(str):
+    """Output of a command that failed; shown like any other output, but
+    the server reports it as an error."""
+
+
+def failure(message):
+    return Failure(Color.RED + message + "\n" + Color.END)
+
+
+def input_error(func):
+    def inner(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except (ValueError, IndexError) as e:
+            print(Color.RED + str(e) + Color.END)
+            return Failure(Color.YELLOW + "Usage: command [arguments]\n" + Color.END)
+        except KeyError as e:
+            print(Color.RED + str(e) + Color.END)
+            return Failure(Color.YELLOW + "Enter user name.\n" + Color.END)
+
+    return inner
+
+
+def input_error_birthday(func):
+    def inner(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except (ValueError, IndexError) as e:
+            print(Color.RED + str(e) + Color.END)
+            return Failure(Color.YELLOW + "Give correct date please.\n" + Color.END)
+
+    return inner
+
+
+class Command:
+    def __init__(self, name, handler, usage, description, arity, mutating, journaled):
+        self.name = name
+        self.handler = handler
+        self.usage = usage
+        self.description = description
+        self.arity = arity
+        self.mutating = mutating
+        # Changes that can't be replayed from the command line alone are
+        # saved with a full checkpoint instead of a journal entry
+        self.journaled = journaled
+
+    def accepts(self, args):
+        return self.arity is None or len(args) == self.arity
+
+
+# Command name -> Command, in the order they are listed by `help`
+COMMANDS = {}
+
+
+def command(
+    name, usage="", description="", arity=None, mutating=False, journaled=True
+):
+    """Register a handler taking (args, book) under a command name."""
+
+    def register(handler):
+        # Timing is a no-op unless instrumentation is switched on
+        COMMANDS[name] = Command(
+            name, timed(name)(handler), usage, description, arity, mutating, journaled
+        )
+        return handler
+
+    return register
+
+
+@cache
+def help_commands():
+    lines = [
+        f"{' '.join(filter(None, [cmd.name, cmd.usage]))} - {cmd.description}"
+        for cmd in COMMANDS.values()
+    ]
+    lines.append("close/exit - Close the application.")
+    return (
+        Color.BOLD
+        + "Available commands:\n"
+        + Color.END
+        + "\n".join(lines)
+        + "\n"
+        + Color.BOLD
+        + "Note: All commands are case insensitive.\n"
+        + Color.END
+    )
+
+
+def commands_markdown():
+    """The README's command list, generated so it can't drift from COMMANDS."""
+    entries = [
+        f"`{cmd.name}`{' ' + cmd.usage if cmd.usage else ''} - "
+        f"{cmd.description.removesuffix('.')}"
+        for cmd in COMMANDS.values()
+    ]
+    entries.append("`close/exit` - Close the application")
+    return "\n\n".join(entries) + "\n"
+
+
+@command("hello", description="Display a welcome message.")
+def hello(args, book):
+    return "How can I help you?"
+
+
+@command(
+    "add",
+    "<name> <phone>",
+    "Add a new contact with a phone number.",
+    mutating=True,
+)
+@input_error
+def add_contact(args, book):
+    # Imported on use, so the prompt doesn't wait for classes (json, re, datetime)
+    from classes import Record
+
+    name, phone = args
+    record = Record(name)
+    record.add_phone(phone)
+    book.add_record(record)
+    return Color.GREEN + "Contact added.\n" + Color.END
+
+
+@command(
+    "change",
+    "<name> <phone>",
+    "Change the phone number of an existing contact.",
+    mutating=True,
+)
+@input_error
+def change_contact(args, book):
+    name, phone = args
+    record = book.find(name)
+    if record:
+        record.edit_phone(record.phones[0], phone)
+        return Color.GREEN + "Contact updated.\n" + Color.END
+    else:
+        return failure("Contact not found.")
+
+
+@command("phone", "<name>", "Show the phone number of a contact.")
+@input_error
+def show_phone(args, book):
+    name = args[0]
+    record = book.find(name)
+    return (
+        record.phones[0] if record else failure("Contact not found.")
+    )
+
+
+@command("find-phone", "<phone>", "Find a contact by phone number.", arity=1)
+@input_error
+def find_contact_by_phone(args, book):
+    phone = args[0]
+    record = book.find_by_phone(phone)
+    return record.name if record else failure("Contact not found.")
+
+
+@command(
+    "find-prefix",
+    "<text>",
+    "Find contacts whose name starts with the text.",
+    arity=1,
+)
+@input_error
+def find_by_prefix(args, book):
+    prefix = args[0]
+    lines = [
+        f"{name}: {'; '.join(str(phone) for phone in book.find(name).phones)}"
+        for name in book.names_with_prefix(prefix)
+    ]
+    return "\n".join(lines) if lines else failure("Contact not found.")
+
+
+@command(
+    "search",
+    "<text>",
+    "Fuzzy search over names, phones, emails and addresses.",
+)
+@input_error
+def search_contacts(args, book):
+    if not args:
+        raise ValueError("Enter text to search for.")
+    lines = [
+        f"{record.name.value}: {'; '.join(str(phone) for phone in record.phones)}"
+        for record in book.search(" ".join(args))
+    ]
+    return "\n".join(lines) if lines else failure("Contact not found.")
+
+
+@command(
+    "search-all",
+    "[-i] <pattern>",
+    "Regex search over the names, addresses, emails and notes of every contact.",
+)
+@input_error
+def search_all_contacts(args, book):
+    import re
+
+    flags = 0
+    if args and args[0] == "-i":
+        flags = re.IGNORECASE
+        args = args[1:]
+    if not args:
+        raise ValueError("Enter a pattern to search for.")
+
+    pattern = " ".join(args)
+    try:
+        re.compile(pattern, flags)
+    except re.error as e:
+        return failure(f"Invalid pattern: {e}")
+
+    # Pulls in multiprocessing, so only loaded when first used
+    from scan import search_all
+
+    return stream_matches(search_all(book, pattern, flags))
+
+
+def stream_matches(matches):
+    found = False
+    for name, field, text in matches:
+        found = True
+        yield f"{name} [{field}]: {text}"
+    if not found:
+        yield Color.RED + "No matches.\n" + Color.END
+
+
+@command(
+    "filter",
+    "<terms>",
+    "Contacts matching all terms, e.g. month=3 !email or phone^050.",
+)
+@input_error
+def filter_contacts(args, book):
+    if not args:
+        raise ValueError("Enter filter terms, e.g. month=3 !email.")
+    records = book.filter(" ".join(args))
+    if not records:
+        return failure("Contact not found.")
+    return stream_filtered(records)
+
+
+def stream_filtered(records):
+    for record in records:
+        yield f"{record.name.value}: {'; '.join(str(phone) for phone in record.phones)}"
+    yield f"{len(records)} contacts."
+
+
+@command(
+    "import",
+    "<file>",
+    "Import contacts from a CSV or vCard (.vcf) file.",
+    arity=1,
+    mutating=True,
+    journaled=False,
+)
+def import_contacts(args, book):
+    from importer import import_file
+
+    try:
+        importer = import_file(args[0], book)
+    except (OSError, UnicodeDecodeError) as e:
+        return failure(str(e))
+    return importer.report()
+
+
+def format_record(record):
+    return f"Name: {record.name}\nPhones: {record.phones}\nEmails: {record.email}\nAddress: {record.address}\nBirthday: {record.birthday}\nNotes: {record.notes}\n"
+
+
+def parse_page(args, default_size=20):
+    options = dict(zip(args[::2], args[1::2]))
+    if len(args) % 2 or set(options) - {"--page", "--size"}:
+        raise ValueError("Usage: all [--page N] [--size M]")
+
+    page = int(options["--page"]) if "--page" in options else None
+    size = int(options.get("--size", default_size))
+    if (page is not None and page < 1) or size < 1:
+        raise ValueError("Page and size must be positive.")
+    return page, size
+
+
+def stream_records(book, names):
+    # Each record is formatted only when the caller asks for the next chunk,
+    # from a copy that is dropped right after (listing doesn't hydrate)
+    shown = False
+    for name in names:
+        shown = True
+        yield format_record(book.peek(name))
+    if not shown:
+        yield Color.YELLOW + "No contacts to show.\n" + Color.END
+
+
+@command(
+    "all",
+    "[--page N] [--size M]",
+    "Show all contacts, or one page of them.",
+)
+@input_error
+def show_all(args, book):
+    page, size = parse_page(args)
+    names = iter(book)
+    if page is not None:
+        names = islice(names, (page - 1) * size, page * size)
+    return stream_records(book, names)
+
+
+@command(
+    "add-address",
+    "<name> <address>",
+    "Add an address to a contact.",
+    mutating=True,
+)
+@input_error
+def add_address(args, book):
+    from classes import Address
+
+    name, *address = args
+    record = book.find(name)
+    if record:
+        address_str = " ".join(address)
+        record.add_address(Address(address_str))
+        return Color.GREEN + "Address added.\n" + Color.END
+    else:
+        return failure("Contact not found.")
+
+
+@command(
+    "edit-address",
+    "<name> <new_address>",
+    "Edit the address of a contact.",
+    mutating=True,
+)
+@input_error
+def change_address(args, book):
+    name, *new_address = args
+    record = book.find(name)
+    if record:
+        record.edit_address(new_address)
+        return Color.GREEN + "Address updated.\n" + Color.END
+    else:
+        return failure("Contact not found.")
+
+
+@command("show-address", "<name>", "Show the address of a contact.", arity=1)
+@input_error
+def show_address(args, book):
+    name = args[0]
+    record = book.find(name)
+    return (
+        str(record.address)
+        if record and record.address
+        else failure("Address not found.")
+    )
+
+
+@command("add-email", "<name> <email>", "Add an email to a contact.", mutating=True)
+@input_error
+def add_email(args, book):
+    name, email = args
+    record = book.find(name)
+    if record:
+        record.add_email(email)
+        return Color.GREEN + "Email added.\n" + Color.END
+    else:
+        return failure("Contact not found.")
+
+
+@command(
+    "edit-email",
+    "<name> <new_email>",
+    "Edit the email of a contact.",
+    arity=2,
+    mutating=True,
+)
+@input_error
+def change_email(args, book):
+    name, new_email = args
+    record = book.find(name)
+    if record:
+        record.edit_email(new_email)
+        return Color.GREEN + "Email updated.\n" + Color.END
+    else:
+        return failure("Contact not found.")
+
+
+@command("show-email", "<name>", "Show the email of a contact.", arity=1)
+@input_error
+def show_email(args, book):
+    name = args[0]
+    record = book.find(name)
+    if record:
+        return (
+            str(record.email.value)
+            if record.email
+            else failure("Email not found.")
+        )
+    else:
+        return failure("Contact not found.")
+
+
+@command("find-email", "<email>", "Find a contact by email.", arity=1)
+@input_error
+def find_contact_by_email(args, book):
+    email = args[0]
+    record = book.find_by_email(email)
+    return record.name if record else failure("Contact not found.")
+
+
+@command(
+    "add-birthday",
+    "<name> <birthday>",
+    "Add a birthday to a contact.",
+    mutating=True,
+)
+@input_error_birthday
+def add_birthday(args, book):
+    name, birthday = args
+    record = book.find(name)
+    if record:
+        record.add_birthday(birthday)
+        return Color.GREEN + "Birthday added.\n" + Color.END
+    else:
+        return failure("Contact not found.")
+
+
+@command("show-birthday", "<name>", "Show the birthday of a contact.")
+@input_error
+def show_birthday(args, book):
+    name = args[0]
+    record = book.find(name)
+
+    return (
+        record.birthday.value
+        if record and record.birthday
+        else failure("Contact and birthday not found.")
+    )
+
+
+@command("birthdays", "[n]", "Show birthdays in the next n days (7 by default).")
+@input_error
+def birthdays(args, book):
+    n_days = int(args[0]) if args else 7
+    if n_days < 0:
+        raise ValueError("Number of days must not be negative.")
+    return book.get_birthdays_for_n_days(n_days) or (
+        Color.YELLOW + f"No birthdays in the next {n_days} days.\n" + Color.END
+    )
+
+
+@command("add-note", "<name> <note>", "Add a note to a contact.", mutating=True)
+@input_error
+def add_note(args, book):
+    name, *note = args
+    record = book.find(name)
+    if record:
+        record.add_note(note)
+        return Color.GREEN + "Note added.\n" + Color.END
+    else:
+        return failure("Contact not found.")
+
+
+@command(
+    "edit-note",
+    "<name> <note_id> <new_content>",
+    "Edit a note of a contact by ID.",
+    mutating=True,
+)
+@input_error
+def edit_note_by_id(args, book):
+    name, note_id, *new_content = args
+    record = book.find(name)
+    if record:
+        return record.edit_note_by_id(note_id, new_content)
+    else:
+        return failure("Contact not found.")
+
+
+@command(
+    "delete-note",
+    "<name> <note_id>",
+    "Delete a note of a contact by ID.",
+    mutating=True,
+)
+@input_error
+def delete_note_by_id(args, book):
+    name, note_id = args
+    record = book.find(name)
+    if record:
+        return record.delete_note_by_id(note_id)
+    else:
+        return failure("Contact not found.")
+
+
+@command("find-note", "<name> <search_content>", "Find a note of a contact by content.")
+@input_error
+def find_note_by_content(args, book):
+    name, search_content = args
+    record = book.find(name)
+    if record:
+        return record.find_note_by_content(search_content)
+    else:
+        return failure("Contact not found.")
+
+
+@command("show-all-notes", "<name>", "Show all notes of a contact.")
+@input_error
+def show_all_notes(args, book):
+    name = args[0]
+    record = book.find(name)
+    return record.notes if record else failure("Contact not found.")
+
+
+@command(
+    "add-tag",
+    "<name> <note_id> <tags>",
+    "Add tags to a note of a contact.",
+    mutating=True,
+)
+@input_error
+def add_tag_to_note(args, book):
+    name, note_id, *tags = args
+    record = book.find(name)
+    if record:
+        return record.add_tag_to_note_by_id(note_id, tags)
+    else:
+        return failure("Contact not found.")
+
+
+@command(
+    "delete-tag",
+    "<name> <note_id> <tag>",
+    "Delete a tag from a note of a contact.",
+    mutating=True,
+)
+@input_error
+def delete_tag_from_note(args, book):
+    name, note_id, tag = args
+    record = book.find(name)
+    if record:
+        return record.remove_tag_from_note_by_id(note_id, tag)
+    else:
+        return failure("Contact not found.")
+
+
+def parse_tags(tags):
+    """Split a trailing tag list; a leading --any switches AND to OR."""
+    if tags and tags[0] == "--any":
+        return tags[1:], False
+    return tags, True
+
+
+@command(
+    "find-note-by-tags",
+    "<name> [--any] <tags>",
+    "Find notes of a contact by tags (all of them, or any with --any).",
+)
+@input_error
+def find_notes_by_tags(args, book):
+    name, *tags = args
+    tags, match_all = parse_tags(tags)
+    record = book.find(name)
+    if record:
+        return record.find_notes_by_tags(tags, match_all)
+    else:
+        return failure("Contact not found.")
+
+
+@command("search-notes", "<terms>", "Search notes of all contacts, best matches first.")
+@input_error
+def search_notes(args, book):
+    if not args:
+        raise ValueError("Give search terms.")
+    results = book.search_notes(args)
+    return (
+        "\n".join(f"{record.name}: {note}" for record, note in results)
+        if results
+        else "No notes found."
+    )
+
+
+@command("find-tag", "[--any] <tags>", "Find notes of all contacts by tags.")
+@input_error
+def find_tag(args, book):
+    tags, match_all = parse_tags(args)
+    if not tags:
+        raise ValueError("Give at least one tag.")
+    results = book.find_by_tags(tags, match_all)
+    return (
+        "\n".join(f"{record.name}: {note}" for record, note in results)
+        if results
+        else "No notes found."
+    )
+
+
+@command(
+    "stats",
+    "[reset | profile <command>]",
+    "Show command latencies (needs --stats) or profile a command's next call.",
+)
+@input_error
+def show_stats(args, book):
+    if not STATS.enabled:
+        return Color.YELLOW + "Instrumentation is off; use --stats.\n" + Color.END
+    if args == ["reset"]:
+        STATS.reset()
+        return "Statistics reset."
+    if len(args) == 2 and args[0] == "profile":
+        if args[1] not in COMMANDS:
+            return failure("Unknown command.")
+        STATS.profile_next = args[1]
+        return f"The next {args[1]} command will be profiled."
+    if args:
+        raise ValueError("Use stats, stats reset or stats profile <command>.")
+
+    lines = [
+        f"{'name':<20} {'calls':>8} {'total ms':>10} "
+        f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+    ]
+    for name, stats in STATS.to_dict().items():
+        lines.append(
+            f"{name:<20} {stats['calls']:>8} {stats['total_ms']:>10.1f} "
+            f"{stats['p50_ms']:>8.3f} {stats['p95_ms']:>8.3f} {stats['p99_ms']:>8.3f}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Regenerates the command list in README.md
+    print(commands_markdown(), end="")
@@ -0,0 +1,240 @@
+import csv
+import re
+from datetime import date
+
+from classes import EMAIL_PATTERN, Address, Birthday, Email, Phone, Record
+
+CHUNK_SIZE = 1000
+PHONE_PATTERN = re.compile(r"\d{10}")
+PHONE_SEPARATORS = re.compile(r"[\s().-]")
+BIRTHDAY_PATTERN = re.compile(r"(\d{2})\.(\d{2})\.(\d{4})")
+VCARD_DATE_PATTERN = re.compile(r"(\d{4})-?(\d{2})-?(\d{2})")
+
+# Accepted CSV headers -> row field
+CSV_COLUMNS = {
+    "name": "name",
+    "full name": "name",
+    "phone": "phones",
+    "phones": "phones",
+    "email": "email",
+    "birthday": "birthday",
+    "address": "address",
+}
+
+
+def empty_row():
+    return {"name": "", "phones": [], "email": None, "birthday": None, "address": None}
+
+
+def read_csv(file):
+    """Yield (line number, row) pairs; several phones are separated by ';'."""
+    reader = csv.DictReader(file)
+    for row_data in reader:
+        row = empty_row()
+        for header, value in row_data.items():
+            field = CSV_COLUMNS.get((header or "").strip().lower())
+            if field is None or not value or not value.strip():
+                continue
+            if field == "phones":
+                row["phones"] = [p for p in value.split(";") if p.strip()]
+            else:
+                row[field] = value.strip()
+        yield reader.line_num, row
+
+
+def unfold(file):
+    # vCard continues long lines on lines starting with a space or tab
+    line = None
+    for raw in file:
+        raw = raw.rstrip("\r\n")
+        if raw[:1] in (" ", "\t") and line is not None:
+            line += raw[1:]
+            continue
+        if line is not None:
+            yield line
+        line = raw
+    if line is not None:
+        yield line
+
+
+def read_vcard(file):
+    """Yield (card number, row) pairs from a vCard file."""
+    row = None
+    number = 0
+    for line in unfold(file):
+        key, _, value = line.partition(":")
+        prop = key.split(";")[0].strip().upper()
+        value = value.strip()
+
+        if prop == "BEGIN":
+            row = empty_row()
+            number += 1
+        elif row is None:
+            continue
+        elif prop == "END":
+            yield number, row
+            row = None
+        elif prop == "FN":
+            row["name"] = value
+        elif prop == "N" and not row["name"]:
+            family, given = (value.split(";") + [""])[:2]
+            row["name"] = " ".join(part for part in (given, family) if part)
+        elif prop == "TEL":
+            row["phones"].append(value)
+        elif prop == "EMAIL" and not row["email"]:
+            row["email"] = value
+        elif prop == "BDAY":
+            match = VCARD_DATE_PATTERN.fullmatch(value)
+            row["birthday"] = (
+                f"{match[3]}.{match[2]}.{match[1]}" if match else value or None
+            )
+        elif prop == "ADR":
+            row["address"] = " ".join(part for part in value.split(";") if part)
+
+
+def validate(row):
+    """Normalize a row with the precompiled patterns; returns (row, error)."""
+    # Commands split on whitespace, so "Eve Adams" is stored as "Eve_Adams"
+    row["name"] = "_".join(row["name"].split())
+    if len(row["name"]) <= 1:
+        return None, "Invalid name"
+
+    phones = []
+    for phone in row["phones"]:
+        digits = PHONE_SEPARATORS.sub("", phone)
+        if not PHONE_PATTERN.fullmatch(digits):
+            return None, f"Invalid phone number {phone!r}"
+        phones.append(digits)
+    row["phones"] = phones
+
+    if row["email"] and not EMAIL_PATTERN.match(row["email"]):
+        return None, f"Invalid email {row['email']!r}"
+
+    birthday = row["birthday"]
+    if birthday:
+        match = BIRTHDAY_PATTERN.fullmatch(birthday)
+        if not match:
+            return None, "Birthday must be in DD.MM.YYYY format"
+        try:
+            date(int(match[3]), int(match[2]), int(match[1]))
+        except ValueError:
+            return None, f"Invalid birthday {birthday!r}"
+
+    return row, None
+
+
+class Importer:
+    """Merge rows into a book one chunk at a time.
+
+    Rows are matched to an existing contact by name, then phone, then
+    email. Touched contacts are detached from the book's indexes while the
+    chunk is processed and re-indexed once when it commits.
+    """
+
+    def __init__(self, book, chunk_size=CHUNK_SIZE):
+        self.book = book
+        self.chunk_size = chunk_size
+        self.added = 0
+        self.merged = 0
+        self.rejected = []
+        # Per-chunk state: touched records and lookups over them
+        self.pending = {}
+        self.by_phone = {}
+        self.by_email = {}
+
+    def run(self, rows):
+        chunk = []
+        for item in rows:
+            chunk.append(item)
+            if len(chunk) >= self.chunk_size:
+                self._import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk)
+        return self
+
+    def _import_chunk(self, chunk):
+        self.pending = {}
+        self.by_phone = {}
+        self.by_email = {}
+
+        validated = [(number, validate(row)) for number, row in chunk]
+        for number, (row, error) in validated:
+            if error:
+                self.rejected.append((number, error))
+            else:
+                self._merge(self._match(row), row)
+
+        # Commit: index every touched record once
+        for record, is_new in self.pending.values():
+            if is_new:
+                self.book.add_record(record)
+                self.added += 1
+            else:
+                record.book = self.book
+                self.book.index_record(record)
+                self.book.mark_dirty(record.name.value)
+                self.merged += 1
+
+    def _match(self, row):
+        name = row["name"]
+        if name in self.pending:
+            return self.pending[name][0]
+        for phone in row["phones"]:
+            if phone in self.by_phone:
+                return self.by_phone[phone]
+        if row["email"] in self.by_email:
+            return self.by_email[row["email"]]
+
+        record = self.book.find(name)
+        for phone in row["phones"]:
+            record = record or self.book.find_by_phone(phone)
+        if record is None and row["email"]:
+            record = self.book.find_by_email(row["email"])
+
+        if record is None:
+            record = Record(name)
+            self.pending[name] = (record, True)
+        else:
+            self.book.unindex_record(record)
+            record.book = None
+            self.pending[record.name.value] = (record, False)
+            # Later rows must still find it while it is out of the indexes
+            for phone in record.phones:
+                self.by_phone[str(phone.value)] = record
+            if record.email and record.email.value:
+                self.by_email[record.email.value] = record
+        return record
+
+    def _merge(self, record, row):
+        # Fill in what the contact doesn't have yet; never overwrite
+        for phone in row["phones"]:
+            if not record.find_phone(phone):
+                record.phones.append(Phone.trusted(phone))
+            self.by_phone[phone] = record
+        if row["email"]:
+            if not record.email:
+                record.email = Email.trusted(row["email"])
+            self.by_email[row["email"]] = record
+        if row["birthday"] and not record.birthday:
+            record.birthday = Birthday.trusted(row["birthday"])
+        if row["address"] and not record.address:
+            record.address = Address(row["address"])
+
+    def report(self, max_rejected=20):
+        lines = [
+            f"Imported {self.added} new contacts, merged {self.merged}, "
+            f"rejected {len(self.rejected)} rows."
+        ]
+        lines += [
+            f"Row {number}: {error}" for number, error in self.rejected[:max_rejected]
+        ]
+        if len(self.rejected) > max_rejected:
+            lines.append(f"... and {len(self.rejected) - max_rejected} more")
+        return "\n".join(lines)
+
+
+def import_file(path, book):
+    reader = read_vcard if path.lower().endswith((".vcf", ".vcard")) else read_csv
+    with open(path, "r", newline="", encoding="utf-8") as file:
+        return Importer(book).run(reader(file))
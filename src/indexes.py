@@ -0,0 +1,237 @@
+import heapq
+import math
+from collections import Counter
+from functools import cache
+from itertools import islice
+
+
+@cache
+def token_pattern():
+    # Compiled on first use: the completer imports this module before the prompt
+    import re
+
+    return re.compile(r"\w+")
+
+
+def tokenize(text):
+    return token_pattern().findall(text.lower())
+
+
+def postings_match(index, keys, match_all=True):
+    """Intersect (AND) or union (OR) the posting sets of ``keys``."""
+    postings = [index.get(key, set()) for key in keys]
+    if not postings:
+        return set()
+    if match_all:
+        postings.sort(key=len)
+        return set.intersection(*postings)
+    return set().union(*postings)
+
+
+class NoteTextIndex:
+    """Book-wide inverted index over note contents.
+
+    Notes are keyed by ``(record name, note id)``; each token maps to the
+    notes containing it together with the term frequency.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.size = 0
+
+    def add(self, name, note):
+        key = (name, note.id)
+        for token, count in Counter(tokenize(note.content)).items():
+            self.postings.setdefault(token, {})[key] = count
+        self.size += 1
+
+    def remove(self, name, note):
+        key = (name, note.id)
+        for token in set(tokenize(note.content)):
+            notes = self.postings.get(token)
+            if notes is None:
+                continue
+            notes.pop(key, None)
+            if not notes:
+                del self.postings[token]
+        self.size -= 1
+
+    def search(self, terms, limit=20):
+        """Return up to ``limit`` (score, key) pairs, best match first.
+
+        A note matches if it contains any of the terms; notes are scored by
+        tf-idf so rarer terms and repeated mentions rank higher.
+        """
+        scores = {}
+        for token in set(tokenize(" ".join(terms))):
+            notes = self.postings.get(token)
+            if not notes:
+                continue
+            idf = math.log(1 + self.size / len(notes))
+            for key, count in notes.items():
+                scores[key] = scores.get(key, 0) + count * idf
+
+        return heapq.nlargest(limit, ((score, key) for key, score in scores.items()))
+
+
+class NameTrie:
+    """Prefix tree over names, used for completion and prefix search."""
+
+    END = ""
+
+    def __init__(self, names=()):
+        self.root = {}
+        for name in names:
+            self.insert(name)
+
+    def insert(self, name):
+        node = self.root
+        for char in name:
+            node = node.setdefault(char, {})
+        node[self.END] = name
+
+    def remove(self, name):
+        path = []
+        node = self.root
+        for char in name:
+            child = node.get(char)
+            if child is None:
+                return
+            path.append((node, char))
+            node = child
+
+        node.pop(self.END, None)
+        # Prune branches that no longer lead to any name
+        for parent, char in reversed(path):
+            if parent[char]:
+                break
+            del parent[char]
+
+    def starting_with(self, prefix):
+        """Lazily yield the names starting with ``prefix`` in sorted order."""
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return
+        yield from self._walk(node)
+
+    def _walk(self, node):
+        # END sorts before every character, so shorter names come first
+        for key in sorted(node):
+            if key == self.END:
+                yield node[key]
+            else:
+                yield from self._walk(node[key])
+
+
+def trigrams(text):
+    text = text.lower()
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def edge_trigrams(text):
+    # Padding gives short texts and word edges trigrams of their own
+    grams = trigrams(f" {text} ")
+    if " " in text:
+        for word in text.split():
+            grams |= trigrams(f" {word} ")
+    return grams
+
+
+def substring_distance(pattern, text):
+    """Fewest edits (with transpositions) turning ``pattern`` into any
+    substring of ``text``."""
+    before = None
+    previous = list(range(len(pattern) + 1))
+    best = len(pattern)
+    last_char = None
+    for char in text:
+        # The match may start anywhere in text, so row[0] stays 0
+        current = [0]
+        for i, pattern_char in enumerate(pattern, 1):
+            cost = current[i - 1] + 1
+            cost = min(cost, previous[i] + 1, previous[i - 1] + (pattern_char != char))
+            if (
+                before is not None
+                and i > 1
+                and pattern_char == last_char
+                and pattern[i - 2] == char
+            ):
+                cost = min(cost, before[i - 2] + 1)
+            current.append(cost)
+        # ... and end anywhere
+        best = min(best, current[-1])
+        before, previous, last_char = previous, current, char
+    return best
+
+
+class TrigramIndex:
+    """Trigrams of every contact's searchable fields, for fuzzy search.
+
+    A query is only scored against the contacts sharing enough trigrams
+    with it to possibly be within the allowed number of edits.
+    """
+
+    def __init__(self):
+        # trigram -> names
+        self.postings = {}
+        # name -> lowercased field texts
+        self.fields = {}
+
+    def add(self, name, texts):
+        texts = [text.lower() for text in texts if text]
+        self.fields[name] = texts
+        postings = self.postings
+        for gram in set().union(*map(edge_trigrams, texts)):
+            names = postings.get(gram)
+            if names is None:
+                postings[gram] = {name}
+            else:
+                names.add(name)
+
+    def remove(self, name):
+        texts = self.fields.pop(name, None)
+        if texts is None:
+            return
+        for gram in set().union(*map(edge_trigrams, texts)):
+            names = self.postings.get(gram)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self.postings[gram]
+
+    def search(self, query, limit=10, max_candidates=500):
+        """Names of the closest matches, best first."""
+        query = query.lower()
+        grams = trigrams(query)
+        max_distance = len(query) // 3
+        shared = Counter()
+        if grams:
+            # Word edges find typos that break every inner trigram
+            for gram in grams | edge_trigrams(query):
+                shared.update(self.postings.get(gram, ()))
+            # Each edit destroys at most three of the query's trigrams
+            required = max(1, len(grams) - 3 * max_distance)
+            candidates = [
+                name
+                for name, count in shared.most_common(max_candidates)
+                if count >= required
+            ]
+        else:
+            # Too short for a trigram: look for it inside the indexed ones
+            candidates = set()
+            for gram, names in self.postings.items():
+                if query in gram:
+                    candidates.update(islice(names, max_candidates - len(candidates)))
+                    if len(candidates) >= max_candidates:
+                        break
+
+        scored = []
+        for name in candidates:
+            distance = min(
+                substring_distance(query, text) for text in self.fields[name]
+            )
+            if distance <= max_distance:
+                scored.append((distance, -shared[name], name))
+        return [name for _, _, name in heapq.nsmallest(limit, scored)]
@@ -0,0 +1,126 @@
+"""Opt-in latency instrumentation for commands and book I/O.
+
+Latencies go into log-scale histograms (four buckets per doubling, so
+percentiles are accurate to about 20%) instead of being kept one by one.
+"""
+
+import math
+import time
+import types
+
+BUCKETS_PER_DOUBLING = 4
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = {}
+        self.calls = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        micros = max(seconds * 1e6, 1.0)
+        bucket = int(math.log2(micros) * BUCKETS_PER_DOUBLING)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.calls += 1
+        self.total += seconds
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction, in ms."""
+        rank = fraction * self.calls
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return 2 ** ((bucket + 1) / BUCKETS_PER_DOUBLING) / 1e3
+        return 0.0
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "total_ms": self.total * 1e3,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+        }
+
+
+class Stats:
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {}
+        # Command whose next call runs under cProfile
+        self.profile_next = None
+
+    def add(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.add(seconds)
+
+    def reset(self):
+        self.histograms = {}
+
+    def to_dict(self):
+        return {name: hist.to_dict() for name, hist in sorted(self.histograms.items())}
+
+    def dump(self, path):
+        import json
+
+        with open(path, "w") as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+
+STATS = Stats()
+
+
+def timed(name):
+    """Record the latency of every call under ``name`` while enabled.
+
+    Streamed (generator) results are timed until they are exhausted.
+    """
+
+    def decorate(func):
+        def inner(*args, **kwargs):
+            if not STATS.enabled:
+                return func(*args, **kwargs)
+            if STATS.profile_next == name:
+                STATS.profile_next = None
+                return profiled(name, func, *args, **kwargs)
+
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            if isinstance(result, types.GeneratorType):
+                return timed_stream(name, result, start)
+            STATS.add(name, time.perf_counter() - start)
+            return result
+
+        return inner
+
+    return decorate
+
+
+def timed_stream(name, chunks, start):
+    try:
+        yield from chunks
+    finally:
+        STATS.add(name, time.perf_counter() - start)
+
+
+def profiled(name, func, *args, **kwargs):
+    # Only needed on request, and slow to import
+    import cProfile
+    import io
+    import pstats
+
+    profile = cProfile.Profile()
+    start = time.perf_counter()
+    result = profile.runcall(func, *args, **kwargs)
+    if isinstance(result, types.GeneratorType):
+        # Run the stream under the profiler too, then replay its chunks
+        result = (chunk for chunk in profile.runcall(list, result))
+    STATS.add(name, time.perf_counter() - start)
+
+    report = io.StringIO()
+    pstats.Stats(profile, stream=report).sort_stats("cumulative").print_stats(15)
+    print(report.getvalue())
+    return result
@@ -0,0 +1,94 @@
+import contextlib
+import io
+import json
+import os
+
+from classes import dump_book
+from snapshot import write_snapshot
+
+
+class Journal:
+    """Append-only log of mutating commands kept next to the book snapshot.
+
+    Every entry carries a sequence number; the snapshot stores the last
+    sequence number it contains, so entries already folded into it are
+    skipped on replay even if the log was not truncated.
+    """
+
+    def __init__(self, path, compact_every=1000, binary_path=None, compression=None):
+        self.path = path
+        self.compact_every = compact_every
+        # Optional memory-mappable copy written next to the JSON snapshot
+        self.binary_path = binary_path
+        # gzip/lzma for the JSON snapshot; reading detects it by itself
+        self.compression = compression
+        self.pending = 0
+        self.file = None
+
+    def replay(self, book, handlers):
+        if not os.path.exists(self.path):
+            return 0
+
+        with open(self.path, "r") as file, contextlib.redirect_stdout(io.StringIO()):
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn last write from a crash
+                    continue
+
+                if entry["seq"] <= book.journal_seq:
+                    continue
+
+                handler = handlers.get(entry["command"])
+                if handler:
+                    handler(entry["args"], book)
+                book.journal_seq = entry["seq"]
+                self.pending += 1
+
+        return self.pending
+
+    def append(self, book, command, args):
+        if self.file is None:
+            self.file = open(self.path, "a")
+
+        book.journal_seq += 1
+        self.file.write(
+            json.dumps({"seq": book.journal_seq, "command": command, "args": args})
+            + "\n"
+        )
+        self.file.flush()
+        self.pending += 1
+
+    def should_compact(self):
+        return self.pending >= self.compact_every
+
+    def compact(self, book, snapshot_path):
+        self.save(book.record_payloads, book.journal_seq, snapshot_path)
+        book.dirty.clear()
+        self.truncate()
+
+    def save(self, payloads, journal_seq, snapshot_path):
+        """Write the snapshot(s) to temp files and rename them into place.
+
+        ``payloads`` returns the record payloads; it is called once per file.
+        """
+        tmp_path = snapshot_path + ".tmp"
+        dump_book(tmp_path, payloads(), journal_seq, self.compression)
+        os.replace(tmp_path, snapshot_path)
+
+        if self.binary_path is not None:
+            # Replacing (not rewriting) keeps an existing mapping of it valid
+            tmp_path = self.binary_path + ".tmp"
+            write_snapshot(payloads(), tmp_path, journal_seq)
+            os.replace(tmp_path, self.binary_path)
+
+    def truncate(self):
+        self.close()
+        open(self.path, "w").close()
+        self.pending = 0
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,134 @@
+import importlib
+import json
+
+CHUNK_SIZE = 1 << 16
+
+# Compression name -> (module, options for writing); reading detects it
+# from the magic bytes. The modules are only imported when used.
+COMPRESSORS = {
+    "gzip": ("gzip", {"compresslevel": 6}),
+    "lzma": ("lzma", {"preset": 3}),
+}
+MAGIC = {b"\x1f\x8b": "gzip", b"\xfd7zXZ\x00": "lzma"}
+NUMBER_CHARS = frozenset("0123456789+-.eE")
+
+
+def open_json(path, mode="r", compression=None):
+    """Open a (possibly compressed) JSON file as buffered text."""
+    if "r" in mode:
+        with open(path, "rb") as file:
+            head = file.read(6)
+        compression = next(
+            (name for magic, name in MAGIC.items() if head.startswith(magic)), None
+        )
+    if compression is None:
+        return open(path, mode, buffering=CHUNK_SIZE)
+    module, options = COMPRESSORS[compression]
+    opener = importlib.import_module(module).open
+    return opener(path, mode + "t", **(options if "w" in mode else {}))
+
+
+def dump_records(file, payloads, **meta):
+    """Stream ``{"records": [...], **meta}`` to ``file`` one record at a time."""
+    file.write('{"records": [')
+    for i, payload in enumerate(payloads):
+        if i:
+            file.write(", ")
+        file.write(json.dumps(payload))
+    file.write("]")
+    for key, value in meta.items():
+        file.write(f", {json.dumps(key)}: {json.dumps(value)}")
+    file.write("}")
+
+
+class _Reader:
+    """Sliding window over a text file for incremental JSON decoding."""
+
+    def __init__(self, file, chunk_size):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what was already consumed so the window stays small
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of JSON document")
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number running into the end of the window may continue in the
+            # next chunk ("1." decodes as 1, "1.5e" as 1.5)
+            if type(value) in (int, float) and not self.eof:
+                tail = end
+                while tail < len(self.buffer) and self.buffer[tail] in NUMBER_CHARS:
+                    tail += 1
+                if tail == len(self.buffer) and self.fill():
+                    continue
+            self.pos = end
+            return value
+
+
+def iter_records(file, meta=None, key="records", chunk_size=CHUNK_SIZE):
+    """Yield the items of the top-level ``key`` array one at a time.
+
+    Other top-level keys are decoded whole and stored into ``meta``.
+    """
+    reader = _Reader(file, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+
+    while True:
+        name = reader.value()
+        reader.expect(":")
+
+        if name == key:
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.pos += 1
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.peek() == "]":
+                        reader.pos += 1
+                        break
+                    reader.expect(",")
+        else:
+            value = reader.value()
+            if meta is not None:
+                meta[name] = value
+
+        if reader.peek() == "}":
+            return
+        reader.expect(",")
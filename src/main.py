@@ -1,44 +1,28 @@
-from datetime import datetime, timedelta
-from classes import AddressBook, Record, Address, Email
-from cli import Autocompleter
-import readline
-import os
-
+import time
 
-# Color formatting for better user experience
-class Color:
-    BOLD = "\033[1m"
-    UNDERLINE = "\033[4m"
-    END = "\033[0m"
-    RED = "\033[91m"
-    GREEN = "\033[92m"
-    YELLOW = "\033[93m"
-    BLUE = "\033[94m"
+# Before any other import, so --startup-profile can account for them
+STARTED = time.perf_counter()
 
+from collections import defaultdict
+import argparse
+import atexit
+import contextlib
+import os
+import sys
+import threading
+import types
 
-def input_error(func):
-    def inner(*args, **kwargs):
-        try:
-            return func(*args, **kwargs)
-        except (ValueError, IndexError) as e:
-            print(Color.RED + str(e) + Color.END)
-            return Color.YELLOW + "Usage: command [arguments]\n" + Color.END
-        except KeyError as e:
-            print(Color.RED + str(e) + Color.END)
-            return Color.YELLOW + "Enter user name.\n" + Color.END
-
-    return inner
-
+STDLIB_IMPORTED = time.perf_counter()
 
-def input_error_birthday(func):
-    def inner(*args, **kwargs):
-        try:
-            return func(*args, **kwargs)
-        except (ValueError, IndexError) as e:
-            print(Color.RED + str(e) + Color.END)
-            return Color.YELLOW + "Give correct date please.\n" + Color.END
+from handlers import COMMANDS, Color, help_commands, input_error
+from instrument import STATS
 
-    return inner
+# The book modules (classes, journal, snapshot) are imported by open_book,
+# on the loader thread when the book loads in the background
+IMPORT_TIMES = [
+    ("import stdlib", STDLIB_IMPORTED - STARTED),
+    ("import handlers", time.perf_counter() - STDLIB_IMPORTED),
+]
 
 
 @input_error
@@ -48,421 +32,374 @@ def parse_input(user_input):
     return cmd, args
 
 
-def help_commands():
-    return (
-        Color.BOLD
-        + "Available commands:\n"
-        + Color.END
-        + "hello"
-        + " - "
-        + "Display a welcome message.\n"
-        + "add <name> <phone>"
-        + " - "
-        + "Add a new contact with a phone number.\n"
-        + "change <name> <phone>"
-        + " - "
-        + "Change the phone number of an existing contact.\n"
-        + "phone <name>"
-        + " - "
-        + "Show the phone number of a contact.\n"
-        + "find-phone <phone>"
-        + " - "
-        + "Find a contact by phone number.\n"
-        + "all"
-        + " - "
-        + "Show all contacts.\n"
-        + "add-address <name> <address>"
-        + " - "
-        + "Add an address to a contact.\n"
-        + "edit-address <name> <new_address>"
-        + " - "
-        + "Edit the address of a contact.\n"
-        + "show-address <name>"
-        + " - "
-        + "Show the address of a contact.\n"
-        + "add-email <name> <email>"
-        + " - "
-        + "Add an email to a contact.\n"
-        + "edit-email <name> <new_email>"
-        + " - "
-        + "Edit the email of a contact.\n"
-        + "show-email <name>"
-        + " - "
-        + "Show the email of a contact.\n"
-        + "find-email <email>"
-        + " - "
-        + "Find a contact by email.\n"
-        + "add-birthday <name> <birthday>"
-        + " - "
-        + "Add a birthday to a contact.\n"
-        + "show-birthday <name>"
-        + " - "
-        + "Show the birthday of a contact.\n"
-        + "birthdays"
-        + " - "
-        + "Show upcoming birthdays.\n"
-        + "add-note <name> <note>"
-        + " - "
-        + "Add a note to a contact.\n"
-        + "edit-note <name> <note_id> <new_content>"
-        + " - "
-        + "Edit a note of a contact by ID.\n"
-        + "delete-note <name> <note_id>"
-        + " - "
-        + "Delete a note of a contact by ID.\n"
-        + "find-note <name> <search_content>"
-        + " - "
-        + "Find a note of a contact by content.\n"
-        + "show-all-notes <name>"
-        + " - "
-        + "Show all notes of a contact.\n"
-        + "add-tag <name> <note_id> <tags>"
-        + " - "
-        + "Add tags to a note of a contact.\n"
-        + "delete-tag <name> <note_id> <tag>"
-        + " - "
-        + "Delete a tag from a note of a contact.\n"
-        + "find-note-by-tags <name> <tags>"
-        + " - "
-        + "Find notes of a contact by tags.\n"
-        + "close/exit"
-        + " - "
-        + "Close the application.\n"
-        + Color.BOLD
-        + "Note: All commands are case insensitive.\n"
-        + Color.END
-    )
-
-
-@input_error
-def add_contact(args, book):
-    name, phone = args
-    record = Record(name)
-    record.add_phone(phone)
-    book.add_record(record)
-    return Color.GREEN + "Contact added.\n" + Color.END
-
-
-@input_error
-def change_contact(args, book):
-    name, phone = args
-    record = book.find(name)
-    if record:
-        record.edit_phone(record.phones[0], phone)
-        return Color.GREEN + "Contact updated.\n" + Color.END
-    else:
-        return Color.RED + "Contact not found.\n" + Color.END
+# Commands that change the book; these are journaled and replayed on startup
+MUTATING_COMMANDS = {
+    name: command.handler
+    for name, command in COMMANDS.items()
+    if command.mutating and command.journaled
+}
 
 
-@input_error
-def show_phone(args, book):
-    name = args[0]
-    record = book.find(name)
-    return (
-        record.phones[0] if record else Color.RED + "Contact not found.\n" + Color.END
+def parse_args():
+    parser = argparse.ArgumentParser(description="Personal helper address book.")
+    parser.add_argument(
+        "script",
+        nargs="?",
+        help="run the commands in this file (or '-' for stdin) and exit",
     )
-
-
-@input_error
-def find_contact_by_phone(args, book):
-    phone = args[0]
-    record = book.find_by_phone(phone)
-    return record.name if record else Color.RED + "Contact not found.\n" + Color.END
-
-
-@input_error_birthday
-def add_birthday(args, book):
-    name, birthday = args
-    record = book.find(name)
-    if record:
-        record.add_birthday(birthday)
-        return Color.GREEN + "Birthday added.\n" + Color.END
-    else:
-        return Color.RED + "Contact not found.\n" + Color.END
-
-
-@input_error
-def show_birthday(args, book):
-    name = args[0]
-    record = book.find(name)
-
-    return (
-        record.birthday.value
-        if record and record.birthday
-        else Color.RED + "Contact and birthday not found.\n" + Color.END
+    parser.add_argument(
+        "--db",
+        metavar="PATH",
+        help="store the book in a SQLite file (imported from book.json when empty)",
     )
-
-
-@input_error
-def add_address(args, book):
-    name, *address = args
-    record = book.find(name)
-    if record:
-        address_str = " ".join(address)
-        record.add_address(Address(address_str))
-        return Color.GREEN + "Address added.\n" + Color.END
-    else:
-        return Color.RED + "Contact not found.\n" + Color.END
-
-
-@input_error
-def show_address(args, book):
-    name = args[0]
-    record = book.find(name)
-    return (
-        str(record.address)
-        if record and record.address
-        else Color.RED + "Address not found.\n" + Color.END
+    parser.add_argument(
+        "--save-every",
+        metavar="N",
+        type=int,
+        help="in batch mode, also save after every N changes",
     )
+    parser.add_argument(
+        "--autosave",
+        metavar="SECONDS",
+        type=float,
+        default=5.0,
+        help="save changes in the background this often, except in batch mode "
+        "(0 to disable)",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=["gzip", "lzma"],
+        help="compress book.json when saving (loading detects it either way)",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="record per-command latencies (see the stats command)",
+    )
+    parser.add_argument(
+        "--stats-out",
+        metavar="FILE",
+        help="record latencies and write them to this JSON file on exit",
+    )
+    parser.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="print how long each startup step took to stderr",
+    )
+    parser.add_argument(
+        "--serve",
+        metavar="ADDRESS",
+        help="serve the book as NDJSON on unix:PATH or [HOST:]PORT (localhost)",
+    )
+    return parser.parse_args()
 
 
-@input_error
-def change_address(args, book):
-    name, *new_address = args
-    print(name)
-    record = book.find(name)
-    if record:
-        record.edit_address(new_address)
-        return Color.GREEN + "Address updated.\n" + Color.END
-    else:
-        return Color.RED + "Contact not found.\n" + Color.END
-
-
-@input_error
-def add_email(args, book):
-    name, email = args
-    record = book.find(name)
-    if record:
-        record.add_email(email)
-        return Color.GREEN + "Email added.\n" + Color.END
-    else:
-        return Color.RED + "Contact not found.\n" + Color.END
-
-
-@input_error
-def change_email(args, book):
-    name, new_email = args
-    record = book.find(name)
-    if record:
-        record.edit_email(new_email)
-        return Color.GREEN + "Email updated.\n" + Color.END
-    else:
-        return Color.RED + "Contact not found.\n" + Color.END
-
-
-@input_error
-def show_email(args, book):
-    name = args[0]
-    record = book.find(name)
-    if record:
-        return (
-            str(record.email.value)
-            if record.email
-            else Color.RED + "Email not found.\n" + Color.END
-        )
-    else:
-        return Color.RED + "Contact not found.\n" + Color.END
-
-
-@input_error
-def find_contact_by_email(args, book):
-    email = args[0]
-    record = book.find_by_email(email)
-    return record.name if record else Color.RED + "Contact not found.\n" + Color.END
-
-
-@input_error
-def add_note(args, book):
-    name, *note = args
-    record = book.find(name)
-    if record:
-        record.add_note(note)
-        return Color.GREEN + "Note added.\n" + Color.END
-    else:
-        return Color.RED + "Contact not found.\n" + Color.END
-
-
-@input_error
-def edit_note_by_id(args, book):
-    name, note_id, *new_content = args
-    record = book.find(name)
-    if record:
-        return record.edit_note_by_id(note_id, new_content)
-    else:
-        return Color.RED + "Contact not found.\n" + Color.END
-
-
-@input_error
-def delete_note_by_id(args, book):
-    name, note_id = args
-    record = book.find(name)
-    if record:
-        return record.delete_note_by_id(note_id)
-    else:
-        return Color.RED + "Contact not found.\n" + Color.END
-
-
-@input_error
-def find_note_by_content(args, book):
-    name, search_content = args
-    record = book.find(name)
-    if record:
-        return record.find_note_by_content(search_content)
-    else:
-        return Color.RED + "Contact not found.\n" + Color.END
-
-
-@input_error
-def show_all_notes(args, book):
-    name = args[0]
-    record = book.find(name)
-    return record.notes if record else Color.RED + "Contact not found.\n" + Color.END
-
-
-@input_error
-def add_tag_to_note(args, book):
-    name, note_id, *tags = args
-    record = book.find(name)
-    if record:
-        return record.add_tag_to_note_by_id(note_id, tags)
-    else:
-        return Color.RED + "Contact not found.\n" + Color.END
-
-
-@input_error
-def delete_tag_from_note(args, book):
-    name, note_id, tag = args
-    record = book.find(name)
-    if record:
-        return record.remove_tag_from_note_by_id(note_id, tag)
-    else:
-        return Color.RED + "Contact not found.\n" + Color.END
-
-
-def find_notes_by_tags(args, book):
-    name, *tags = args
-    record = book.find(name)
-    if record:
-        return record.find_notes_by_tags(tags)
+def emit(output):
+    # Handlers may stream their output as a generator of chunks
+    if isinstance(output, types.GeneratorType):
+        for chunk in output:
+            print(chunk)
     else:
-        return Color.RED + "Contact not found.\n" + Color.END
-
-
-def birthdays(book):
-    return book.get_birthdays_per_week()
-
-
-def show_all(book):
-    return "\n\n".join(
-        f"Name: {record.name}\nPhones: {record.phones}\nEmails: {record.email}\nAddress: {record.address}\nBirthday: {record.birthday}\nNotes: {record.notes}\n"
-        for name, record in book.data.items()
+        print(output)
+
+
+class Storage:
+    """Where changes go: the journal for book.json, commits for SQLite."""
+
+    def __init__(self, book, journal, book_path):
+        self.book = book
+        self.journal = journal
+        self.book_path = book_path
+        # Held while a command runs; the autosaver takes it to copy the book
+        self.lock = threading.RLock()
+        self.saver = None
+
+    def start_autosave(self, interval):
+        if self.journal is not None and interval > 0:
+            from autosave import AutoSaver
+
+            self.saver = AutoSaver(
+                self.book, self.journal, self.book_path, self.lock, interval
+            )
+            self.saver.start()
+
+    def record(self, command, args):
+        if self.journal is None or not COMMANDS[command].journaled:
+            self.checkpoint()
+            return
+
+        self.journal.append(self.book, command, args)
+        # With an autosaver the snapshot is rewritten in the background
+        if self.saver is None and self.journal.should_compact():
+            self.journal.compact(self.book, self.book_path)
+
+    def checkpoint(self):
+        if self.journal is None:
+            self.book.commit()
+        elif self.saver is not None:
+            # Callers hold the lock the saver needs, so it can't be waited for
+            self.saver.request()
+        else:
+            self.journal.compact(self.book, self.book_path)
+
+    def close(self):
+        if self.journal is None:
+            self.book.close()
+        elif self.saver is not None:
+            self.saver.stop()
+            self.saver.save()
+        elif self.book.dirty or self.journal.pending:
+            # A session that changed nothing leaves the files alone
+            self.journal.compact(self.book, self.book_path)
+
+
+def data_path(name):
+    return os.getcwd() + "/src/" + name
+
+
+def open_book(options, profile=None):
+    start = time.perf_counter()
+    from classes import AddressBook
+    from journal import Journal
+    from snapshot import MappedAddressBook, is_fresh
+
+    if profile is not None:
+        profile.report("book load: imports", time.perf_counter() - start)
+
+    book_path = data_path("book.json")
+
+    if options.db:
+        from sqlite_book import SQLiteAddressBook
+
+        book = SQLiteAddressBook(options.db)
+        if not len(book) and os.path.exists(book_path):
+            book.import_json(book_path)
+        return Storage(book, None, book_path)
+
+    binary_path = data_path("book.bin")
+    journal = Journal(
+        data_path("book.journal"),
+        binary_path=binary_path,
+        compression=options.compress,
+    )
+    book = None
+    if is_fresh(binary_path, book_path):
+        try:
+            # Only maps the file; records are decoded as they are looked up
+            book = MappedAddressBook(binary_path)
+        except ValueError:
+            # Older snapshot format: book.json has the same records, and the
+            # next save rewrites book.bin
+            if not os.path.exists(book_path):
+                raise
+    if book is None:
+        book = AddressBook()
+        book.from_json(book_path, lazy=True)
+    if journal.replay(book, MUTATING_COMMANDS):
+        # Fold recovered changes into the snapshot right away
+        journal.compact(book, book_path)
+    return Storage(book, journal, book_path)
+
+
+class StartupProfile:
+    """Time-to-prompt breakdown for --startup-profile, written to stderr."""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.last = STARTED
+        for step, seconds in IMPORT_TIMES:
+            self.mark(step, seconds)
+
+    def mark(self, step, seconds=None):
+        # Time since the previous step on the main thread, unless given
+        if seconds is None:
+            seconds = time.perf_counter() - self.last
+        self.last += seconds
+        self.report(step, seconds, self.last)
+
+    def report(self, step, seconds, at=None):
+        if self.enabled:
+            at = ((at or time.perf_counter()) - STARTED) * 1e3
+            print(
+                f"startup: {step:<28} {seconds * 1e3:>8.1f} ms (at {at:.1f} ms)",
+                file=sys.stderr,
+            )
+
+
+class BookLoader(threading.Thread):
+    """Opens the book off the main thread so the prompt shows up at once.
+
+    Commands wait for it with result(); completion just offers no contact
+    names until it is done.
+    """
+
+    def __init__(self, options, profile):
+        super().__init__(name="book-loader", daemon=True)
+        self.options = options
+        self.profile = profile
+        self.storage = None
+        self.error = None
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            self.storage = open_book(self.options, self.profile)
+        except Exception as e:
+            self.error = e
+        if self.ident is not None:
+            # Started as a thread; the main thread times a foreground load
+            self.profile.report("book load (background)", time.perf_counter() - start)
+
+    def result(self):
+        if self.ident is not None:
+            self.join()
+        if self.error is not None:
+            raise self.error
+        return self.storage
+
+    def names_with_prefix(self, prefix):
+        if self.storage is None:
+            return ()
+        return self.storage.book.names_with_prefix(prefix)
+
+
+def loads_in_background(options):
+    # SQLite connections can't change threads, and a journal replay
+    # redirects stdout, which would swallow the prompt
+    journal_path = data_path("book.journal")
+    return not options.db and not (
+        os.path.exists(journal_path) and os.path.getsize(journal_path)
     )
 
 
-def main():
-    commands = [
-        "hello",
-        "add",
-        "change",
-        "phone",
-        "find-phone",
-        "all",
-        "add-address",
-        "edit-address",
-        "show-address",
-        "add-email",
-        "edit-email",
-        "show-email",
-        "find-email",
-        "add-birthday",
-        "show-birthday",
-        "birthdays",
-        "add-note",
-        "edit-note",
-        "delete-note",
-        "find-note",
-        "show-all-notes",
-        "add-tag",
-        "delete-tag",
-        "find-note-by-tags",
-        "close",
-        "exit",
-        "help",
-    ]
-
-    completer = Autocompleter(commands)
+def run_interactive(loader, autosave, profile):
+    # Only needed for the prompt, not for batch or server mode
+    import readline
+    from cli import Autocompleter
+
+    commands = [*COMMANDS, "close", "exit", "help"]
+    completer = Autocompleter(commands, loader)
     readline.set_completer_delims(" \t\n;")
     readline.set_completer(completer.complete)
     readline.parse_and_bind("tab: complete")
+    profile.mark("readline and completer")
+    profile.report("time to prompt", time.perf_counter() - STARTED)
 
-    book = AddressBook()
-    print("Welcome to the address book application!")
-    book.from_json(os.getcwd() + "/src/book.json")
-
+    storage = None
     try:
         while True:
             user_input = input("Enter a command: ")
             command, args = parse_input(user_input)
 
+            if storage is None:
+                storage = loader.result()
+                storage.start_autosave(autosave)
+                book = storage.book
+
             if command in ["close", "exit"]:
                 print(Color.YELLOW + "Goodbye!\n" + Color.END)
-                book.to_json(os.getcwd() + "/src/book.json")
+                storage.close()
                 break
             elif command == "help":
                 print(help_commands())
-            elif command == "hello":
-                print("How can I help you?")
-            elif command == "add":
-                print(add_contact(args, book))
-            elif command == "change":
-                print(change_contact(args, book))
-            elif command == "phone":
-                print(show_phone(args, book))
-            elif command == "find-phone" and len(args) == 1:
-                print(find_contact_by_phone(args, book))
-            elif command == "all":
-                print(show_all(book))
-            elif command == "add-address":
-                print(add_address(args, book))
-            elif command == "edit-address":
-                print(change_address(args, book))
-            elif command == "show-address" and len(args) == 1:
-                print(show_address(args, book))
-            elif command == "add-email":
-                print(add_email(args, book))
-            elif command == "edit-email" and len(args) == 2:
-                print(change_email(args, book))
-            elif command == "show-email" and len(args) == 1:
-                print(show_email(args, book))
-            elif command == "find-email" and len(args) == 1:
-                print(find_contact_by_email(args, book))
-            elif command == "add-birthday":
-                print(add_birthday(args, book))
-            elif command == "show-birthday":
-                print(show_birthday(args, book))
-            elif command == "birthdays":
-                print(birthdays(book))
-            elif command == "add-note":
-                print(add_note(args, book))
-            elif command == "edit-note":
-                print(edit_note_by_id(args, book))
-            elif command == "delete-note":
-                print(delete_note_by_id(args, book))
-            elif command == "find-note":
-                print(find_note_by_content(args, book))
-            elif command == "show-all-notes":
-                print(show_all_notes(args, book))
-            elif command == "add-tag":
-                print(add_tag_to_note(args, book))
-            elif command == "delete-tag":
-                print(delete_tag_from_note(args, book))
-            elif command == "find-note-by-tags":
-                print(find_notes_by_tags(args, book))
+            elif command in COMMANDS and COMMANDS[command].accepts(args):
+                cmd = COMMANDS[command]
+                with storage.lock:
+                    emit(cmd.handler(args, book))
+                    if cmd.mutating:
+                        storage.record(command, args)
             else:
                 print(Color.RED + "Invalid command.\n" + Color.END)
     except KeyboardInterrupt:
         print(Color.YELLOW + "Goodbye!\n" + Color.END)
-        book.to_json(os.getcwd() + "/src/book.json")
+        (storage or loader.result()).close()
+
+
+def run_batch(lines, storage, save_every=None, buffer_size=1 << 20):
+    """Run commands non-interactively: no prompt or colors, buffered output,
+    one save at the end (plus one every ``save_every`` changes)."""
+    book = storage.book
+    timings = defaultdict(lambda: [0, 0.0])
+    changes = 0
+
+    Color.disable()
+    sys.stdout.flush()
+    output = open(sys.stdout.fileno(), "w", buffering=buffer_size, closefd=False)
+    with output, contextlib.redirect_stdout(output):
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            command, *args = line.split()
+            command = command.lower()
+            if command in ["close", "exit"]:
+                break
+
+            start = time.perf_counter()
+            if command == "help":
+                print(help_commands())
+            elif command in COMMANDS and COMMANDS[command].accepts(args):
+                cmd = COMMANDS[command]
+                emit(cmd.handler(args, book))
+                if cmd.mutating:
+                    changes += 1
+                    if save_every and changes % save_every == 0:
+                        storage.checkpoint()
+            else:
+                print(f"Line {number}: invalid command.")
+            timing = timings[command]
+            timing[0] += 1
+            timing[1] += time.perf_counter() - start
+
+    storage.close()
+
+    print(f"{'command':<20} {'calls':>8} {'total ms':>10} {'avg ms':>8}", file=sys.stderr)
+    for command, (calls, seconds) in sorted(timings.items()):
+        print(
+            f"{command:<20} {calls:>8} {seconds * 1e3:>10.1f} "
+            f"{seconds * 1e3 / calls:>8.3f}",
+            file=sys.stderr,
+        )
+
+
+def main():
+    options = parse_args()
+    profile = StartupProfile(options.startup_profile)
+    profile.mark("arguments")
+    if options.stats or options.stats_out:
+        STATS.enabled = True
+    if options.stats_out:
+        atexit.register(STATS.dump, options.stats_out)
+
+    if options.serve:
+        from server import serve
+
+        storage = open_book(options, profile)
+        storage.start_autosave(options.autosave)
+        serve(storage, options.serve)
+        return
+
+    batch = options.script is not None or not sys.stdin.isatty()
+
+    if not batch:
+        print("Welcome to the address book application!")
+        loader = BookLoader(options, profile)
+        if loads_in_background(options):
+            loader.start()
+        else:
+            loader.run()
+            profile.mark("book load")
+        run_interactive(loader, options.autosave, profile)
+        return
+
+    storage = open_book(options, profile)
+    profile.mark("book load")
+    if options.script in (None, "-"):
+        run_batch(sys.stdin, storage, options.save_every)
+    else:
+        with open(options.script, "r") as file:
+            run_batch(file, storage, options.save_every)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,85 @@
+"""Book-wide regex scans, sharded over a process pool.
+
+Workers get plain (name, address, email, notes) tuples rather than
+Record objects, so a shard pickles cheaply and never drags the book
+along through Record.book.
+"""
+
+import atexit
+import multiprocessing
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+SHARD_SIZE = 5000
+WORKERS = os.cpu_count() or 1
+
+_pool = None
+
+
+def scan_shard(pattern, flags, shard):
+    """(name, field, text) for every field of the shard matching ``pattern``."""
+    regex = re.compile(pattern, flags)
+    matches = []
+    for name, address, email, notes in shard:
+        if regex.search(name):
+            matches.append((name, "name", name))
+        if address and regex.search(address):
+            matches.append((name, "address", address))
+        if email and regex.search(email):
+            matches.append((name, "email", email))
+        for note_id, content in notes:
+            if regex.search(content):
+                matches.append((name, f"note {note_id}", content))
+    return matches
+
+
+def shards(book, shard_size=SHARD_SIZE):
+    contacts = (
+        (
+            payload["name"],
+            payload.get("address"),
+            payload.get("email"),
+            [(note.get("id"), note["content"]) for note in payload.get("notes", ())],
+        )
+        for payload in book.record_payloads()
+    )
+    while shard := list(islice(contacts, shard_size)):
+        yield shard
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # Not fork: the autosave and loader threads may hold locks, which a
+        # forked child would inherit in their locked state
+        _pool = ProcessPoolExecutor(
+            WORKERS, mp_context=multiprocessing.get_context("forkserver")
+        )
+        atexit.register(_pool.shutdown)
+    return _pool
+
+
+def search_all(book, pattern, flags=0, shard_size=SHARD_SIZE):
+    """Yield the matches of ``pattern`` in book order.
+
+    Books of a couple of shards are scanned in-process; larger ones are
+    scanned in parallel with a bounded number of shards in flight, so
+    results stream back while later shards are still being built.
+    """
+    contact_shards = shards(book, shard_size)
+    if WORKERS == 1 or len(book) < 2 * shard_size:
+        for shard in contact_shards:
+            yield from scan_shard(pattern, flags, shard)
+        return
+
+    pool = _get_pool()
+    pending = deque()
+    for shard in contact_shards:
+        pending.append(pool.submit(scan_shard, pattern, flags, shard))
+        if len(pending) >= 2 * WORKERS:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
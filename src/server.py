@@ -0,0 +1,208 @@
+"""Serve the address book over a local socket.
+
+The protocol is newline-delimited JSON. Each request is one line such as
+
+    {"id": 1, "command": "phone", "args": ["Alice"]}
+
+and gets exactly one response line, in request order per connection:
+
+    {"id": 1, "ok": true, "output": "1234567890"}
+
+A command that fails (bad arguments, unknown contact) gets "ok": false and
+its message as "error". Clients may pipeline: send many requests without
+waiting for replies.
+
+Handlers run on worker threads, so a slow command (search-all, or the
+first lookup that hydrates a lazily loaded book) doesn't stall the event
+loop: other connections are still read from and answered. They do not run
+concurrently though: every handler takes the book lock, since even a
+lookup can hydrate records. Long streamed outputs are produced in batches
+so other reads get in between.
+"""
+
+import asyncio
+import contextlib
+import io
+import ipaddress
+import json
+import os
+import stat
+import sys
+import types
+from itertools import islice
+
+from handlers import COMMANDS, Color, Failure
+
+# Let other requests use the book after this many chunks of streamed output
+YIELD_EVERY = 100
+
+
+class ReadWriteLock:
+    """Any number of readers or a single writer; waiting writers go first.
+
+    This only orders requests: readers still take the book lock one at a
+    time. What it buys is that no change lands while a streamed output is
+    being produced in batches, and that streams can interleave.
+    """
+
+    def __init__(self):
+        self.condition = asyncio.Condition()
+        self.readers = 0
+        self.writer = False
+        self.writers_waiting = 0
+
+    @contextlib.asynccontextmanager
+    async def reading(self):
+        async with self.condition:
+            await self.condition.wait_for(
+                lambda: not self.writer and not self.writers_waiting
+            )
+            self.readers += 1
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.readers -= 1
+                self.condition.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def writing(self):
+        async with self.condition:
+            self.writers_waiting += 1
+            await self.condition.wait_for(lambda: not self.writer and not self.readers)
+            self.writers_waiting -= 1
+            self.writer = True
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.writer = False
+                self.condition.notify_all()
+
+
+class BookServer:
+    def __init__(self, storage):
+        self.storage = storage
+        self.rw_lock = ReadWriteLock()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                response = await self.handle_request(line)
+                writer.write(json.dumps(response).encode() + b"\n")
+                # Only wait for the client when it stops reading
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, line):
+        try:
+            request = json.loads(line)
+            name = request["command"]
+            args = [str(arg) for arg in request.get("args", [])]
+        except (ValueError, TypeError, KeyError):
+            return {"id": None, "ok": False, "error": "Invalid request."}
+
+        request_id = request.get("id")
+        command = COMMANDS.get(name)
+        if command is None or not command.accepts(args):
+            return {"id": request_id, "ok": False, "error": "Invalid command."}
+
+        try:
+            if command.mutating:
+                async with self.rw_lock.writing():
+                    failed, output = await asyncio.to_thread(self.run, command, args)
+            else:
+                async with self.rw_lock.reading():
+                    failed, output = await asyncio.to_thread(self.run, command, args)
+                    output = await self.collect(output)
+        except Exception as e:
+            # One bad request must not take the connection (or server) down
+            return {"id": request_id, "ok": False, "error": str(e)}
+        if failed:
+            return {"id": request_id, "ok": False, "error": output.rstrip("\n")}
+        return {"id": request_id, "ok": True, "output": output.rstrip("\n")}
+
+    def run(self, command, args):
+        """(failed, output) of a command; output may be a generator."""
+        # Handlers report errors with print(), so capture it as output too
+        printed = io.StringIO()
+        with self.storage.lock, contextlib.redirect_stdout(printed):
+            output = command.handler(args, self.storage.book)
+            if command.mutating:
+                self.storage.record(command.name, args)
+        if isinstance(output, types.GeneratorType):
+            return False, output
+        failed = isinstance(output, Failure)
+        return failed, printed.getvalue() + ("" if output is None else str(output))
+
+    async def collect(self, output):
+        if isinstance(output, str):
+            return output
+
+        # Streamed output: take the book lock per batch of chunks and let
+        # other readers run in between
+        chunks = []
+        while batch := await asyncio.to_thread(self.next_chunks, output):
+            chunks += batch
+        return "\n".join(chunks)
+
+    def next_chunks(self, output):
+        with self.storage.lock:
+            return list(islice(output, YIELD_EVERY))
+
+    async def serve(self, address):
+        family, *where = parse_address(address)
+        if family == "unix":
+            (path,) = where
+            # A socket left behind by a previous run; never any other file
+            if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+                os.unlink(path)
+            server = await asyncio.start_unix_server(self.handle_connection, path)
+        else:
+            host, port = where
+            server = await asyncio.start_server(self.handle_connection, host, port)
+
+        async with server:
+            await server.serve_forever()
+
+
+def parse_address(address):
+    """("unix", path) or ("tcp", host, port); only loopback hosts are allowed."""
+    if address.startswith("unix:"):
+        path = address[len("unix:") :]
+        if os.path.exists(path) and not stat.S_ISSOCK(os.stat(path).st_mode):
+            raise ValueError(f"{path} exists and is not a socket.")
+        return "unix", path
+
+    host, _, port = address.rpartition(":")
+    host = host.strip("[]") or "127.0.0.1"
+    if not port.isdigit():
+        raise ValueError(f"Invalid port {port!r}.")
+    if host != "localhost":
+        try:
+            loopback = ipaddress.ip_address(host).is_loopback
+        except ValueError:
+            loopback = False
+        if not loopback:
+            raise ValueError(f"Only localhost can be served, not {host}.")
+    return "tcp", host, int(port)
+
+
+def serve(storage, address):
+    """Run the server until interrupted, then save and close the book."""
+    Color.disable()
+    try:
+        parse_address(address)
+        print(f"Serving the address book on {address}")
+        asyncio.run(BookServer(storage).serve(address))
+    except ValueError as e:
+        print(f"Cannot serve on {address}: {e}", file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        storage.close()
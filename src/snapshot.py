@@ -0,0 +1,336 @@
+"""Binary book snapshot that can be memory-mapped and queried in place.
+
+Layout (little-endian):
+
+    header   magic, version, record count, journal sequence number and the
+             offsets of the sections below
+    blobs    one compact JSON object per record
+    table    per record: blob offset/length and name offset/length
+    names    record numbers sorted by name
+    phones   (key offset, key length, record number) sorted by key, then pool
+    emails   same as phones
+    birthdays same as phones, keyed by the birthday's (month, day) bytes
+
+Every lookup is a binary search over fixed-size entries, and only the
+matching record's blob is decoded.
+"""
+
+import json
+import mmap
+import os
+import struct
+
+from classes import AddressBook
+from utils import birthday_key
+from indexes import NameTrie
+
+MAGIC = b"PHBK"
+VERSION = 2
+HEADER = struct.Struct("<4sIIQQQQQQ")
+TABLE_ENTRY = struct.Struct("<QIQI")
+NAME_ENTRY = struct.Struct("<I")
+KEY_ENTRY = struct.Struct("<QII")
+COUNT = struct.Struct("<I")
+
+
+def write_snapshot(payloads, path, journal_seq=0):
+    """Write record payloads (dicts as produced by record_to_dict)."""
+    table = []
+    names = []
+    phones = []
+    emails = []
+    birthdays = []
+
+    with open(path, "wb") as file:
+        file.write(b"\0" * HEADER.size)
+
+        for number, payload in enumerate(payloads):
+            blob = json.dumps(payload, separators=(",", ":")).encode()
+            name = payload["name"].encode()
+            offset = file.tell()
+            file.write(blob)
+            file.write(name)
+            table.append((offset, len(blob), offset + len(blob), len(name)))
+            names.append(name)
+
+            for phone in payload["phones"]:
+                phones.append((str(phone).encode(), number))
+            if payload.get("email"):
+                emails.append((payload["email"].encode(), number))
+            if payload.get("birthday"):
+                birthdays.append((bytes(birthday_key(payload["birthday"])), number))
+
+        table_offset = file.tell()
+        for entry in table:
+            file.write(TABLE_ENTRY.pack(*entry))
+
+        names_offset = file.tell()
+        file.write(COUNT.pack(len(table)))
+        for number in sorted(range(len(names)), key=names.__getitem__):
+            file.write(NAME_ENTRY.pack(number))
+
+        phones_offset = _write_key_index(file, phones)
+        emails_offset = _write_key_index(file, emails)
+        birthdays_offset = _write_key_index(file, birthdays)
+
+        file.seek(0)
+        file.write(
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                len(table),
+                journal_seq,
+                table_offset,
+                names_offset,
+                phones_offset,
+                emails_offset,
+                birthdays_offset,
+            )
+        )
+
+
+def _write_key_index(file, keys):
+    keys.sort()
+    offset = file.tell()
+    file.write(COUNT.pack(len(keys)))
+
+    pool_offset = offset + COUNT.size + KEY_ENTRY.size * len(keys)
+    position = pool_offset
+    for key, number in keys:
+        file.write(KEY_ENTRY.pack(position, len(key), number))
+        position += len(key)
+    for key, _ in keys:
+        file.write(key)
+    return offset
+
+
+class Snapshot:
+    """Read-only view of a binary snapshot through mmap."""
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (
+            magic,
+            version,
+            self.count,
+            self.journal_seq,
+            self.table_offset,
+            self.names_offset,
+            self.phones_offset,
+            self.emails_offset,
+            self.birthdays_offset,
+        ) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f"{path} is not a book snapshot")
+
+    def __len__(self):
+        return self.count
+
+    def name(self, number):
+        _, _, offset, length = TABLE_ENTRY.unpack_from(
+            self.map, self.table_offset + number * TABLE_ENTRY.size
+        )
+        return self.map[offset : offset + length].decode()
+
+    def payload(self, number):
+        offset, length, _, _ = TABLE_ENTRY.unpack_from(
+            self.map, self.table_offset + number * TABLE_ENTRY.size
+        )
+        return json.loads(self.map[offset : offset + length])
+
+    def names(self):
+        """Names in record order."""
+        for number in range(self.count):
+            yield self.name(number)
+
+    def find(self, name):
+        """Record number of ``name``, or None."""
+        key = name.encode()
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            number = self._name_entry(middle)
+            if self.name(number).encode() < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count:
+            number = self._name_entry(low)
+            if self.name(number) == name:
+                return number
+        return None
+
+    def find_by_phone(self, phone):
+        """Record numbers carrying ``phone``, in record order."""
+        return self._find_key(self.phones_offset, str(phone).encode())
+
+    def find_by_email(self, email):
+        return self._find_key(self.emails_offset, email.encode())
+
+    def find_by_birthday(self, key):
+        """Record numbers whose birthday falls on the (month, day) ``key``."""
+        return self._find_key(self.birthdays_offset, bytes(key))
+
+    def _name_entry(self, index):
+        return NAME_ENTRY.unpack_from(
+            self.map, self.names_offset + COUNT.size + index * NAME_ENTRY.size
+        )[0]
+
+    def _find_key(self, index_offset, key):
+        # Entries are sorted by (key, record number), so the matches are a
+        # contiguous run starting at the lower bound
+        (count,) = COUNT.unpack_from(self.map, index_offset)
+        entries = index_offset + COUNT.size
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(entries, middle)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        while low < count:
+            found, number = self._key(entries, low)
+            if found != key:
+                break
+            yield number
+            low += 1
+
+    def _key(self, entries, index):
+        offset, length, number = KEY_ENTRY.unpack_from(
+            self.map, entries + index * KEY_ENTRY.size
+        )
+        return self.map[offset : offset + length], number
+
+    def close(self):
+        self.map.close()
+
+
+def is_fresh(snapshot_path, json_path):
+    """Whether the binary snapshot was written after the JSON one."""
+    return os.path.exists(snapshot_path) and (
+        not os.path.exists(json_path)
+        or os.path.getmtime(snapshot_path) >= os.path.getmtime(json_path)
+    )
+
+
+class MappedAddressBook(AddressBook):
+    """AddressBook over a binary snapshot.
+
+    Opening it only maps the file. A record is decoded and hydrated the
+    first time it is touched; from then on (or once it is deleted or
+    replaced) the in-memory copy takes precedence over the snapshot.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.snapshot = Snapshot(path)
+        self.journal_seq = self.snapshot.journal_seq
+        # Snapshot names superseded by memory: hydrated, deleted or replaced
+        self.superseded = set()
+
+    def _snapshot_number(self, name):
+        if name in self.superseded:
+            return None
+        return self.snapshot.find(name)
+
+    def add_record(self, record):
+        name = record.name.value
+        if name not in self.data and self._snapshot_number(name) is not None:
+            self.delete(name)
+        super().add_record(record)
+
+    def delete(self, name):
+        if name in self.data:
+            super().delete(name)
+        elif self._snapshot_number(name) is not None:
+            self.superseded.add(name)
+            if self.name_trie is not None:
+                self.name_trie.remove(name)
+            self.mark_dirty(name)
+        else:
+            raise KeyError(name)
+
+    def __getitem__(self, name):
+        if name in self.data:
+            return self.data[name]
+
+        number = self._snapshot_number(name)
+        if number is None:
+            raise KeyError(name)
+        record = self.record_from_dict(self.snapshot.payload(number))
+        self.superseded.add(name)
+        self.data[name] = record
+        record.book = self
+        self._index_all(record)
+        return record
+
+    def peek(self, name):
+        if name in self.data:
+            return self.data[name]
+        number = self._snapshot_number(name)
+        if number is None:
+            raise KeyError(name)
+        return self.record_from_dict(self.snapshot.payload(number))
+
+    def __contains__(self, name):
+        return name in self.data or self._snapshot_number(name) is not None
+
+    def __iter__(self):
+        for name in self.snapshot.names():
+            if name in self.data or name not in self.superseded:
+                yield name
+        for name in self.data:
+            if self.snapshot.find(name) is None:
+                yield name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def hydrate_all(self):
+        for name in list(self):
+            self[name]
+
+    def names_with_prefix(self, prefix):
+        if self.name_trie is None:
+            self.name_trie = NameTrie(self)
+        return self.name_trie.starting_with(prefix)
+
+    def find_by_phone(self, phone_number):
+        records = self.phone_index.get(str(phone_number))
+        if records:
+            return next(iter(records.values()))
+        return self._find_unhydrated(self.snapshot.find_by_phone(phone_number))
+
+    def find_by_email(self, email):
+        records = self.email_index.get(email)
+        if records:
+            return next(iter(records.values()))
+        return self._find_unhydrated(self.snapshot.find_by_email(email))
+
+    def birthdays_on(self, keys):
+        names = []
+        for key in keys:
+            names += self.birthday_index.get(key, ())
+            for number in self.snapshot.find_by_birthday(key):
+                name = self.snapshot.name(number)
+                if name not in self.superseded:
+                    names.append(name)
+        return names
+
+    def _find_unhydrated(self, numbers):
+        # Hydrated records are answered by the in-memory indexes above
+        for number in numbers:
+            name = self.snapshot.name(number)
+            if name not in self.superseded:
+                return self[name]
+        return None
+
+    def record_payloads(self):
+        for name in self:
+            if name in self.data:
+                yield self.record_to_dict(self.data[name])
+            else:
+                yield self.snapshot.payload(self.snapshot.find(name))
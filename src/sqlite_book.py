@@ -0,0 +1,428 @@
+import sqlite3
+import sys
+
+from classes import AddressBook, NoteBook
+from indexes import TrigramIndex, tokenize
+from utils import get_birthdays_for_n_days
+from jsonstream import iter_records, open_json
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    address TEXT,
+    birthday TEXT
+);
+CREATE TABLE IF NOT EXISTS phones (
+    record_id INTEGER NOT NULL REFERENCES records(id) ON DELETE CASCADE,
+    phone TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS emails (
+    record_id INTEGER NOT NULL REFERENCES records(id) ON DELETE CASCADE,
+    email TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS notes (
+    record_id INTEGER NOT NULL REFERENCES records(id) ON DELETE CASCADE,
+    note_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    PRIMARY KEY (record_id, note_id)
+);
+CREATE TABLE IF NOT EXISTS note_tags (
+    record_id INTEGER NOT NULL,
+    note_id INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    FOREIGN KEY (record_id, note_id) REFERENCES notes(record_id, note_id)
+        ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS records_birthday_day ON records(substr(birthday, 1, 5));
+CREATE INDEX IF NOT EXISTS phones_phone ON phones(phone);
+CREATE INDEX IF NOT EXISTS phones_record ON phones(record_id);
+CREATE INDEX IF NOT EXISTS emails_email ON emails(email);
+CREATE INDEX IF NOT EXISTS emails_record ON emails(record_id);
+CREATE INDEX IF NOT EXISTS note_tags_tag ON note_tags(tag, record_id, note_id);
+CREATE INDEX IF NOT EXISTS note_tags_note ON note_tags(record_id, note_id);
+-- Full-text index over notes.content, kept in sync by index_note/unindex_note
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(content, content='notes');
+"""
+
+
+class SQLiteNoteBook(NoteBook):
+    """NoteBook whose searches run as queries against the record's rows."""
+
+    __slots__ = ()
+
+    def search(self, search_string):
+        pattern = (
+            "%"
+            + search_string.replace("\\", "\\\\")
+            .replace("%", "\\%")
+            .replace("_", "\\_")
+            + "%"
+        )
+        rows = self.record.book.connection.execute(
+            "SELECT n.note_id FROM notes n JOIN records r ON r.id = n.record_id "
+            "WHERE r.name = ? AND n.content LIKE ? ESCAPE '\\' ORDER BY n.note_id",
+            (self.record.name.value, pattern),
+        )
+        return self._format_found(row[0] for row in rows)
+
+    def find_note_by_tags(self, tags, match_all=True):
+        tags = set(tags)
+        if not tags:
+            return super().find_note_by_tags(tags, match_all)
+
+        rows = self.record.book.connection.execute(
+            "SELECT t.note_id FROM note_tags t JOIN records r ON r.id = t.record_id "
+            f"WHERE r.name = ? AND t.tag IN ({', '.join('?' * len(tags))}) "
+            "GROUP BY t.note_id HAVING COUNT(DISTINCT t.tag) >= ? ORDER BY t.note_id",
+            (self.record.name.value, *tags, len(tags) if match_all else 1),
+        )
+        return self._format_found(row[0] for row in rows)
+
+    def _format_found(self, note_ids):
+        found_notes = [self.find_note_by_id(note_id) for note_id in note_ids]
+        return (
+            "\n".join(str(note) for note in found_notes if note)
+            if found_notes
+            else "No notes found."
+        )
+
+
+class SQLiteAddressBook(AddressBook):
+    """AddressBook backed by a SQLite file.
+
+    Records are loaded from the database on first access and cached; every
+    change made through Record/NoteBook is written through the index hooks
+    and becomes durable on commit().
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        # The server runs handlers on worker threads; Storage.lock already
+        # makes sure only one of them uses the connection at a time
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        has_fts = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'notes_fts'"
+        ).fetchone()
+        self.connection.executescript(SCHEMA)
+        if not has_fts:
+            # Databases created before the full-text index existed
+            self.connection.execute(
+                "INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')"
+            )
+
+    def add_record(self, record):
+        name = record.name.value
+        if name in self:
+            self.delete(name)
+        self._adopt(record)
+        self.data[name] = record
+        self._index_all(record)
+
+    def delete(self, name):
+        # The notes go by cascade, which the full-text index doesn't follow
+        self.connection.executemany(
+            "INSERT INTO notes_fts(notes_fts, rowid, content) VALUES ('delete', ?, ?)",
+            self.connection.execute(
+                "SELECT n.rowid, n.content FROM notes n "
+                "JOIN records r ON r.id = n.record_id WHERE r.name = ?",
+                (name,),
+            ).fetchall(),
+        )
+        cursor = self.connection.execute("DELETE FROM records WHERE name = ?", (name,))
+        if not cursor.rowcount:
+            raise KeyError(name)
+        record = self.data.pop(name, None)
+        if record is not None:
+            record.book = None
+        if self.trigrams is not None:
+            self.trigrams.remove(name)
+        if self.columns is not None:
+            self.columns.remove(name)
+
+    def __contains__(self, name):
+        return name in self.data or self._record_id(name) is not None
+
+    def __getitem__(self, name):
+        record = self.data.get(name)
+        if record is None:
+            payload = self._payload(name)
+            if payload is None:
+                raise KeyError(name)
+            record = self._adopt(self.record_from_dict(payload))
+            self.data[name] = record
+        return record
+
+    def peek(self, name):
+        record = self.data.get(name)
+        if record is None:
+            payload = self._payload(name)
+            if payload is None:
+                raise KeyError(name)
+            record = self.record_from_dict(payload)
+        return record
+
+    def __iter__(self):
+        for (name,) in self.connection.execute("SELECT name FROM records ORDER BY id"):
+            yield name
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def find_by_phone(self, phone_number):
+        return self._find_one(
+            "SELECT r.name FROM phones p JOIN records r ON r.id = p.record_id "
+            "WHERE p.phone = ? ORDER BY r.id LIMIT 1",
+            str(phone_number),
+        )
+
+    def find_by_email(self, email):
+        return self._find_one(
+            "SELECT r.name FROM emails e JOIN records r ON r.id = e.record_id "
+            "WHERE e.email = ? ORDER BY r.id LIMIT 1",
+            email,
+        )
+
+    def search_notes(self, terms, limit=20):
+        tokens = set(tokenize(" ".join(terms)))
+        if not tokens:
+            return []
+
+        # Tokens are \w+ runs, so quoting them is all the escaping needed
+        rows = self.connection.execute(
+            "SELECT r.name, n.note_id FROM notes_fts f "
+            "JOIN notes n ON n.rowid = f.rowid JOIN records r ON r.id = n.record_id "
+            "WHERE notes_fts MATCH ? ORDER BY f.rank LIMIT ?",
+            (" OR ".join(f'"{token}"' for token in sorted(tokens)), limit),
+        )
+        results = []
+        for name, note_id in rows.fetchall():
+            record = self[name]
+            results.append((record, record.notes.find_note_by_id(note_id)))
+        return results
+
+    def find_by_tags(self, tags, match_all=True):
+        tags = set(tags)
+        if not tags:
+            return []
+
+        rows = self.connection.execute(
+            "SELECT r.name, t.note_id FROM note_tags t "
+            "JOIN records r ON r.id = t.record_id "
+            f"WHERE t.tag IN ({', '.join('?' * len(tags))}) "
+            "GROUP BY t.record_id, t.note_id HAVING COUNT(DISTINCT t.tag) >= ? "
+            "ORDER BY r.name, t.note_id",
+            (*tags, len(tags) if match_all else 1),
+        )
+        results = []
+        for name, note_id in rows.fetchall():
+            record = self[name]
+            results.append((record, record.notes.find_note_by_id(note_id)))
+        return results
+
+    def search(self, query, limit=10):
+        if self.trigrams is None:
+            # One pass over the rows instead of loading every record
+            self.trigrams = TrigramIndex()
+            for name, phones, email, address, _ in self._contact_rows():
+                self.trigrams.add(name, [name, *phones, email, address])
+        return [self[name] for name in self.trigrams.search(query, limit)]
+
+    def filter(self, query):
+        from columnar import ColumnStore, parse_filter
+
+        predicates = parse_filter(query)
+        if self.columns is None:
+            self.columns = ColumnStore()
+            for name, *fields in self._contact_rows():
+                self.columns.set(name, *fields)
+        return [self[name] for name in self.columns.filter(predicates)]
+
+    def _contact_rows(self):
+        """(name, phones, email, address, birthday) of every contact."""
+        rows = self.connection.execute(
+            "SELECT r.name, "
+            "(SELECT group_concat(phone, ' ') FROM phones WHERE record_id = r.id), "
+            "(SELECT email FROM emails WHERE record_id = r.id), "
+            "r.address, r.birthday FROM records r ORDER BY r.id"
+        )
+        for name, phones, email, address, birthday in rows:
+            yield name, (phones or "").split(), email, address, birthday
+
+    def names_with_prefix(self, prefix):
+        # A half-open range on the unique name index
+        rows = self.connection.execute(
+            "SELECT name FROM records WHERE name >= ? AND name < ? ORDER BY name",
+            (prefix, prefix + "\U0010ffff"),
+        )
+        return (name for (name,) in rows)
+
+    def get_birthdays_for_n_days(self, n_days):
+        return get_birthdays_for_n_days(self, n_days)
+
+    def birthdays_on(self, keys):
+        days = [f"{day:02d}.{month:02d}" for month, day in keys]
+        rows = self.connection.execute(
+            "SELECT name FROM records "
+            f"WHERE substr(birthday, 1, 5) IN ({', '.join('?' * len(days))}) "
+            "ORDER BY id",
+            days,
+        )
+        return [name for (name,) in rows]
+
+    def _find_one(self, query, value):
+        row = self.connection.execute(query, (value,)).fetchone()
+        return self[row[0]] if row else None
+
+    # Write-through hooks called by Record and NoteBook
+    def index_record(self, record):
+        self.connection.execute(
+            "INSERT INTO records (name, address, birthday) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET "
+            "address = excluded.address, birthday = excluded.birthday",
+            (
+                record.name.value,
+                str(record.address) if record.address else None,
+                record.birthday.value if record.birthday else None,
+            ),
+        )
+        record_id = self._record_id(record.name.value)
+        self.connection.executemany(
+            "INSERT INTO phones (record_id, phone) VALUES (?, ?)",
+            [(record_id, str(phone.value)) for phone in record.phones],
+        )
+        if record.email and record.email.value:
+            self.connection.execute(
+                "INSERT INTO emails (record_id, email) VALUES (?, ?)",
+                (record_id, record.email.value),
+            )
+        if self.trigrams is not None:
+            self.trigrams.add(record.name.value, self.search_fields(record))
+        if self.columns is not None:
+            self.columns.set(record.name.value, *self.column_fields(record))
+
+    def unindex_record(self, record):
+        record_id = self._record_id(record.name.value)
+        self.connection.execute("DELETE FROM phones WHERE record_id = ?", (record_id,))
+        self.connection.execute("DELETE FROM emails WHERE record_id = ?", (record_id,))
+        if self.trigrams is not None:
+            self.trigrams.remove(record.name.value)
+        if self.columns is not None:
+            self.columns.remove(record.name.value)
+
+    def index_note(self, record, note):
+        record_id = self._record_id(record.name.value)
+        cursor = self.connection.execute(
+            "INSERT INTO notes (record_id, note_id, content) VALUES (?, ?, ?)",
+            (record_id, note.id, note.content),
+        )
+        self.connection.execute(
+            "INSERT INTO notes_fts(rowid, content) VALUES (?, ?)",
+            (cursor.lastrowid, note.content),
+        )
+        self.connection.executemany(
+            "INSERT INTO note_tags (record_id, note_id, tag) VALUES (?, ?, ?)",
+            [(record_id, note.id, tag) for tag in note.tags],
+        )
+
+    def unindex_note(self, record, note):
+        key = (self._record_id(record.name.value), note.id)
+        row = self.connection.execute(
+            "SELECT rowid FROM notes WHERE record_id = ? AND note_id = ?", key
+        ).fetchone()
+        if row is None:
+            return
+        # An external-content index needs the indexed text to remove it
+        self.connection.execute(
+            "INSERT INTO notes_fts(notes_fts, rowid, content) VALUES ('delete', ?, ?)",
+            (row[0], note.content),
+        )
+        self.connection.execute(
+            "DELETE FROM notes WHERE record_id = ? AND note_id = ?", key
+        )
+
+    def _record_id(self, name):
+        row = self.connection.execute(
+            "SELECT id FROM records WHERE name = ?", (name,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _adopt(self, record):
+        notebook = SQLiteNoteBook(record)
+        notebook.notes = record.notes.notes
+        notebook.next_id = record.notes.next_id
+        notebook.tag_index = record.notes.tag_index
+        record.notes = notebook
+        record.book = self
+        return record
+
+    def _payload(self, name):
+        row = self.connection.execute(
+            "SELECT id, address, birthday FROM records WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        record_id, address, birthday = row
+        phones = self.connection.execute(
+            "SELECT phone FROM phones WHERE record_id = ? ORDER BY rowid", (record_id,)
+        )
+        email = self.connection.execute(
+            "SELECT email FROM emails WHERE record_id = ?", (record_id,)
+        ).fetchone()
+        tags = {}
+        for note_id, tag in self.connection.execute(
+            "SELECT note_id, tag FROM note_tags WHERE record_id = ? ORDER BY rowid",
+            (record_id,),
+        ):
+            tags.setdefault(note_id, []).append(tag)
+        notes = self.connection.execute(
+            "SELECT note_id, content FROM notes WHERE record_id = ? ORDER BY note_id",
+            (record_id,),
+        )
+
+        return {
+            "name": name,
+            "phones": [phone for (phone,) in phones],
+            "email": email[0] if email else None,
+            "address": address,
+            "birthday": birthday,
+            "notes": [
+                {"id": note_id, "content": content, "tags": tags.get(note_id, [])}
+                for note_id, content in notes
+            ],
+        }
+
+    def record_payloads(self):
+        for name in self:
+            yield self._payload(name)
+
+    def import_json(self, path):
+        """One-shot import of a book.json snapshot into the database."""
+        with open_json(path) as file:
+            for payload in iter_records(file):
+                record = self.record_from_dict(payload)
+                self.add_record(record)
+                # Don't keep the whole imported book cached in memory
+                del self.data[record.name.value]
+        self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self.dirty.clear()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("Usage: python sqlite_book.py <book.json> <book.db>")
+
+    book = SQLiteAddressBook(sys.argv[2])
+    book.import_json(sys.argv[1])
+    print(f"Imported {len(book)} records into {sys.argv[2]}")
+    book.close()
@@ -1,31 +1,49 @@
+from calendar import isleap
 from datetime import datetime, timedelta
 from collections import defaultdict
 
-def get_birthdays_for_n_days(users, n_days):
-    today = datetime.today().date()
-    end_date = today + timedelta(days=n_days)
+
+def birthday_key(birthday):
+    """Calendar bucket (month, day) of a DD.MM.YYYY birthday."""
+    day, month, _ = birthday.split(".")
+    return int(month), int(day)
+
+
+def upcoming_days(n_days, today=None):
+    """Yield (date, bucket keys) for today and the following n_days.
+
+    Feb 29 birthdays are celebrated on Feb 28 in non-leap years. Every
+    bucket is yielded at most once, so a query never touches more than a
+    year's worth of buckets.
+    """
+    today = today or datetime.today().date()
+    seen = set()
+
+    for offset in range(n_days + 1):
+        current = today + timedelta(days=offset)
+        keys = [(current.month, current.day)]
+        if (current.month, current.day) == (2, 28) and not isleap(current.year):
+            keys.append((2, 29))
+
+        keys = [key for key in keys if key not in seen]
+        if keys:
+            seen.update(keys)
+            yield current, keys
+        elif len(seen) >= 366:
+            break
+
+
+def get_birthdays_for_n_days(book, n_days, today=None):
     birthdays = defaultdict(list)
-    res = ""
-
-    for user in users:
-        name = users[user].name.value
-        if users[user].birthday is None or users[user].birthday.birthday is None:
-            continue
-        birthday = (users[user].birthday.birthday).date()
-    
-        birthday_this_year = birthday.replace(year=today.year)
-
-        if birthday_this_year < today:
-            birthday_this_year = birthday_this_year.replace(year=today.year + 1)
-
-        if today <= birthday_this_year <= end_date:
-            day_of_week = birthday_this_year.weekday()
-            if day_of_week >= 5:  # if it's weekend then move to Monday
-                day_of_week = 0
-            birthdays[day_of_week].append(name)
-            
-    days_of_week = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
-    for i, day in enumerate(days_of_week):
-        if birthdays[i]:
-            res += f"{day}: {', '.join(birthdays[i])}\n"
-    return res.strip()
+
+    for day, keys in upcoming_days(n_days, today):
+        names = book.birthdays_on(keys)
+        if names:
+            if day.weekday() >= 5:  # if it's weekend then move to Monday
+                day += timedelta(days=7 - day.weekday())
+            birthdays[day].extend(names)
+
+    return "\n".join(
+        f"{day.strftime('%A %d.%m.%Y')}: {', '.join(names)}"
+        for day, names in sorted(birthdays.items())
+    )
@@ -0,0 +1,79 @@
+from datetime import date
+
+from classes import AddressBook, Record
+from journal import Journal
+from utils import get_birthdays_for_n_days
+
+
+def saved_book(tmp_path, size=5):
+    path = str(tmp_path / "book.json")
+    book = AddressBook()
+    for i in range(size):
+        record = Record(f"user{i}")
+        record.add_phone(f"050000000{i}")
+        record.add_email(f"user{i}@example.com")
+        book.add_record(record)
+    Journal(str(tmp_path / "book.journal")).compact(book, path)
+    return path
+
+
+def test_reverse_lookups_hydrate_only_the_match(tmp_path):
+    book = AddressBook()
+    book.from_json(saved_book(tmp_path), lazy=True)
+
+    assert book.find_by_phone("0500000003").name.value == "user3"
+    assert book.unhydrated == 4
+    assert book.find_by_email("user1@example.com").name.value == "user1"
+    assert book.unhydrated == 3
+    assert book.find_by_phone("0999999999") is None
+    assert book.find_by_email("nobody@example.com") is None
+
+
+def test_reverse_lookups_follow_changes_to_lazy_records(tmp_path):
+    book = AddressBook()
+    book.from_json(saved_book(tmp_path), lazy=True)
+
+    book.delete("user2")
+    assert book.find_by_phone("0500000002") is None
+    assert book.find_by_email("user2@example.com") is None
+
+    book.find_by_phone("0500000004").edit_phone("0500000004", "0671234567")
+    assert book.find_by_phone("0500000004") is None
+    assert book.find_by_phone("0671234567").name.value == "user4"
+
+
+def test_birthdays_on_a_lazy_book_do_not_hydrate_it(tmp_path):
+    path = str(tmp_path / "book.json")
+    book = AddressBook()
+    for name, birthday in [
+        ("Alice", "14.03.1990"),
+        ("Bob", "20.03.1985"),
+        ("Eve", None),
+    ]:
+        record = Record(name)
+        record.add_phone("0501234567")
+        record.add_birthday(birthday)
+        book.add_record(record)
+    Journal(str(tmp_path / "book.journal")).compact(book, path)
+
+    lazy = AddressBook()
+    lazy.from_json(path, lazy=True)
+    # Alice's birthday is on a Saturday, so it moves to Monday
+    week = get_birthdays_for_n_days(lazy, 7, today=date(2026, 3, 13))
+    assert week == "Monday 16.03.2026: Alice\nFriday 20.03.2026: Bob"
+    assert lazy.unhydrated == 3
+
+    lazy.delete("Alice")
+    assert lazy.birthdays_on([(3, 14)]) == []
+
+
+def test_all_on_a_lazy_book_does_not_hydrate_it(tmp_path):
+    from handlers import COMMANDS, format_record
+
+    book = AddressBook()
+    book.from_json(saved_book(tmp_path), lazy=True)
+    book["user1"].add_note("call back")
+
+    output = list(COMMANDS["all"].handler([], book))
+    assert book.unhydrated == 4
+    assert output == [format_record(book[f"user{i}"]) for i in range(5)]
@@ -0,0 +1,112 @@
+import json
+import os
+import threading
+
+from autosave import AutoSaver
+from classes import AddressBook, Record
+from journal import Journal
+from main import Storage
+
+
+def make_record(name, phone):
+    record = Record(name)
+    record.add_phone(phone)
+    return record
+
+
+def saved_names(path):
+    with open(path) as file:
+        return [payload["name"] for payload in json.load(file)["records"]]
+
+
+class SlowJournal(Journal):
+    """Blocks in save() until released, so a save can be caught mid-write."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def save(self, payloads, journal_seq, snapshot_path):
+        self.writing.set()
+        self.release.wait(5)
+        super().save(payloads, journal_seq, snapshot_path)
+
+
+def test_checkpoint_during_background_save_does_not_deadlock(tmp_path):
+    book = AddressBook()
+    book.add_record(make_record("Alice", "0501234567"))
+    journal = SlowJournal(str(tmp_path / "book.journal"))
+    storage = Storage(book, journal, str(tmp_path / "book.json"))
+    storage.saver = AutoSaver(book, journal, storage.book_path, storage.lock, 60)
+
+    background = threading.Thread(target=storage.saver.save)
+    background.start()
+    assert journal.writing.wait(5)
+
+    checkpointed = threading.Event()
+
+    def command():
+        with storage.lock:
+            book.add_record(make_record("Bob", "0507654321"))
+            storage.checkpoint()
+        checkpointed.set()
+
+    threading.Thread(target=command, daemon=True).start()
+    assert checkpointed.wait(5)
+    journal.release.set()
+    background.join(5)
+    assert not background.is_alive()
+
+
+def test_save_streams_untouched_records_from_previous_snapshot(tmp_path):
+    path = str(tmp_path / "book.json")
+    book = AddressBook()
+    for i in range(5):
+        book.add_record(make_record(f"user{i}", f"050000000{i}"))
+    journal = Journal(str(tmp_path / "book.journal"))
+    journal.compact(book, path)
+
+    reloaded = AddressBook()
+    reloaded.from_json(path, lazy=True)
+    reloaded["user1"].add_phone("0670000001")
+    reloaded.delete("user3")
+    reloaded.add_record(make_record("Zed", "0631111111"))
+
+    saver = AutoSaver(reloaded, journal, path, threading.RLock())
+    assert saver.save()
+    assert not saver.save()
+    assert saved_names(path) == ["user0", "user1", "user2", "user4", "Zed"]
+
+    check = AddressBook()
+    check.from_json(path)
+    assert [str(p) for p in check["user1"].phones] == ["0500000001", "0670000001"]
+
+
+def test_save_streams_from_binary_snapshot_without_book_json(tmp_path):
+    path = str(tmp_path / "book.json")
+    book = AddressBook()
+    for i in range(3):
+        book.add_record(make_record(f"user{i}", f"050000000{i}"))
+    journal = Journal(
+        str(tmp_path / "book.journal"), binary_path=str(tmp_path / "book.bin")
+    )
+    journal.compact(book, path)
+    os.remove(path)
+
+    book.add_record(make_record("Zed", "0631111111"))
+    saver = AutoSaver(book, journal, path, threading.RLock())
+    assert saver.save()
+    assert saved_names(path) == ["user0", "user1", "user2", "Zed"]
+
+
+def test_loading_a_book_does_not_make_it_dirty(tmp_path):
+    path = str(tmp_path / "book.json")
+    book = AddressBook()
+    book.add_record(make_record("Alice", "0501234567"))
+    Journal(str(tmp_path / "book.journal")).compact(book, path)
+
+    for lazy in (False, True):
+        reloaded = AddressBook()
+        reloaded.from_json(path, lazy=lazy)
+        assert not reloaded.dirty
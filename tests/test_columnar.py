@@ -0,0 +1,123 @@
+from datetime import date
+
+import pytest
+
+import columnar
+from columnar import ColumnStore, parse_filter
+
+BIRTHDAYS = [
+    "31.12.1989",
+    "01.01.1990",
+    "14.03.1990",
+    "31.12.1990",
+    "01.01.1991",
+    "29.02.1992",
+    "28.02.1985",
+    None,
+]
+
+# The same queries as plain Python over (phones, email, address, born)
+QUERIES = {
+    "year=1990": lambda c: c[3] is not None and c[3].year == 1990,
+    "year!=1990": lambda c: c[3] is not None and c[3].year != 1990,
+    "year<1990": lambda c: c[3] is not None and c[3].year < 1990,
+    "year<=1990": lambda c: c[3] is not None and c[3].year <= 1990,
+    "year>1990": lambda c: c[3] is not None and c[3].year > 1990,
+    "year>=1990": lambda c: c[3] is not None and c[3].year >= 1990,
+    "month=2": lambda c: c[3] is not None and c[3].month == 2,
+    "day>=29": lambda c: c[3] is not None and c[3].day >= 29,
+    "born<01.03.1990": lambda c: c[3] is not None and c[3] < date(1990, 3, 1),
+    "phone^050": lambda c: any(p.startswith("050") for p in c[0]),
+    "phone^06700001": lambda c: any(p.startswith("06700001") for p in c[0]),
+    "phone=0630000007": lambda c: "0630000007" in c[0],
+    "email": lambda c: c[1] is not None,
+    "!email": lambda c: c[1] is None,
+    "address": lambda c: c[2] is not None,
+    "!address": lambda c: c[2] is None,
+    "birthday": lambda c: c[3] is not None,
+    "!birthday": lambda c: c[3] is None,
+    "year=1990 !email phone^067": lambda c: (
+        c[3] is not None
+        and c[3].year == 1990
+        and c[1] is None
+        and any(p.startswith("067") for p in c[0])
+    ),
+}
+
+
+@pytest.fixture(params=["numpy", "array"])
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        monkeypatch.setattr(columnar, "numpy", pytest.importorskip("numpy"))
+    else:
+        monkeypatch.setattr(columnar, "numpy", None)
+    return request.param
+
+
+def contact(i):
+    phones = [f"{('050', '063', '097')[i % 3]}00000{i % 20:02d}"]
+    if i % 4 == 1:
+        phones.append(f"067{i:07d}")
+    email = f"user{i}@example.com" if i % 3 else None
+    address = f"{i} Main Street" if i % 5 else None
+    return phones, email, address, BIRTHDAYS[i % len(BIRTHDAYS)]
+
+
+def make_store(size=200):
+    store = ColumnStore()
+    contacts = {}
+    for i in range(size):
+        contacts[f"user{i}"] = contact(i)
+    # Updates and removals leave dead rows and phone slots behind
+    for i in range(0, size, 4):
+        contacts[f"user{i}"] = contact(i + 1)
+    for i in range(0, size, 7):
+        del contacts[f"user{i}"]
+
+    for i in range(size):
+        store.set(f"user{i}", *contact(i))
+    for i in range(0, size, 4):
+        store.set(f"user{i}", *contact(i + 1))
+    for i in range(0, size, 7):
+        store.remove(f"user{i}")
+    return store, contacts
+
+
+def expected(contacts, query):
+    def born(birthday):
+        if birthday is None:
+            return None
+        day, month, year = birthday.split(".")
+        return date(int(year), int(month), int(day))
+
+    predicate = QUERIES[query]
+    rows = {
+        name: (phones, email, address, born(birthday))
+        for name, (phones, email, address, birthday) in contacts.items()
+    }
+    return sorted(name for name, row in rows.items() if predicate(row))
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_filter_matches_a_python_loop(backend, query):
+    store, contacts = make_store()
+    found = store.filter(parse_filter(query))
+
+    assert sorted(found) == expected(contacts, query)
+    assert len(found) == len(set(found))
+
+
+def test_filter_keeps_row_order(backend):
+    store, contacts = make_store()
+    rows = [name for name in store.names if name in contacts]
+    assert store.filter(parse_filter("birthday")) == [
+        name for name in rows if contacts[name][3] is not None
+    ]
+
+
+@pytest.mark.parametrize(
+    "query", ["phone<050", "phone^05x", "month^3", "nickname", "born=1990"]
+)
+def test_invalid_terms_are_rejected(query):
+    with pytest.raises(ValueError):
+        parse_filter(query)
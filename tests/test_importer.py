@@ -0,0 +1,142 @@
+import pytest
+
+from classes import AddressBook, Record
+from importer import import_file
+
+VCARDS = """BEGIN:VCARD
+VERSION:3.0
+FN:Eve Adams
+TEL;TYPE=cell:(050) 123-45-67
+BDAY:1990-03-14
+END:VCARD
+BEGIN:VCARD
+N:Stone;Frank
+TEL:12345
+END:VCARD
+BEGIN:VCARD
+N:Adams;Eve
+EMAIL:eve@example.com
+ADR:;;1 Main
+  Street;Kyiv
+END:VCARD
+"""
+
+
+def make_book():
+    book = AddressBook()
+    for name, phone, email in [
+        ("Alice", "0500000001", "alice@example.com"),
+        ("Bob", "0500000002", "bob@example.com"),
+    ]:
+        record = Record(name)
+        record.add_phone(phone)
+        record.add_email(email)
+        book.add_record(record)
+    return book
+
+
+def imported(tmp_path, text, book=None, file_name="contacts.csv"):
+    book = book or make_book()
+    path = tmp_path / file_name
+    path.write_text(text)
+    return book, import_file(str(path), book)
+
+
+def birthday(book, name):
+    record = book.find(name)
+    return record.birthday.value if record.birthday else None
+
+
+@pytest.mark.parametrize(
+    "row, owner",
+    [
+        # The name wins over a phone and an email of another contact
+        ("Alice,0500000002,bob@example.com", "Alice"),
+        # Then the phone wins over the email
+        ("Carol,0500000002,alice@example.com", "Bob"),
+        # And the email is the last resort
+        ("Carol,0509999999,alice@example.com", "Alice"),
+    ],
+)
+def test_rows_match_by_name_then_phone_then_email(tmp_path, row, owner):
+    text = f"name,phone,email,birthday\n{row},14.03.1990\n"
+    book, importer = imported(tmp_path, text)
+
+    assert (importer.added, importer.merged) == (0, 1)
+    assert "Carol" not in book
+    assert birthday(book, owner) == "14.03.1990"
+    assert [birthday(book, name) for name in book if name != owner] == [None]
+
+
+def test_merge_fills_missing_fields_and_never_overwrites(tmp_path):
+    book, _ = imported(
+        tmp_path,
+        "name,phone,email,birthday,address\n"
+        "Alice,0500000009,other@example.com,14.03.1990,1 Main Street\n"
+        "Alice,,,01.01.2000,2 Side Street\n",
+    )
+
+    alice = book.find("Alice")
+    assert [str(phone) for phone in alice.phones] == ["0500000001", "0500000009"]
+    assert alice.email.value == "alice@example.com"
+    assert alice.birthday.value == "14.03.1990"
+    assert str(alice.address) == "1 Main Street"
+    assert book.find_by_phone("0500000009") is alice
+
+
+def test_rows_in_the_same_chunk_merge_with_each_other(tmp_path):
+    book, importer = imported(
+        tmp_path,
+        "name,phone,email\n"
+        "Dave,0501111111,\n"
+        "David,0501111111;0502222222,\n"
+        "Dave,,dave@example.com\n"
+        "Dee,0503333333,dave@example.com\n",
+    )
+
+    assert (importer.added, importer.merged) == (1, 0)
+    dave = book.find("Dave")
+    phones = [str(phone) for phone in dave.phones]
+    assert phones == ["0501111111", "0502222222", "0503333333"]
+    assert dave.email.value == "dave@example.com"
+    assert book.find_by_phone("0502222222") is dave
+    assert book.find_by_email("dave@example.com") is dave
+    assert book.find("David") is None and book.find("Dee") is None
+
+
+def test_rejected_rows_are_reported_with_their_line_numbers(tmp_path):
+    _, importer = imported(
+        tmp_path,
+        "name,phone,email,birthday\n"
+        "Gina,0504444444,,\n"
+        "Hank,12345,,\n"
+        "I,0505555555,,\n"
+        "Jill,0506666666,not-an-email,\n"
+        "Kyle,0507777777,,31.02.1990\n",
+    )
+
+    assert importer.added == 1
+    assert [number for number, _ in importer.rejected] == [3, 4, 5, 6]
+    assert importer.report().splitlines()[1:] == [
+        "Row 3: Invalid phone number '12345'",
+        "Row 4: Invalid name",
+        "Row 5: Invalid email 'not-an-email'",
+        "Row 6: Invalid birthday '31.02.1990'",
+    ]
+
+
+def test_vcard_names_with_spaces_become_one_word(tmp_path):
+    book, importer = imported(tmp_path, VCARDS, file_name="contacts.vcf")
+
+    assert importer.rejected == [(2, "Invalid phone number '12345'")]
+    assert (importer.added, importer.merged) == (1, 0)
+    eve = book.find("Eve_Adams")
+    assert [str(phone) for phone in eve.phones] == ["0501234567"]
+    assert eve.email.value == "eve@example.com"
+    assert eve.birthday.value == "14.03.1990"
+    assert str(eve.address) == "1 Main Street Kyiv"
+
+
+def test_csv_names_with_spaces_become_one_word(tmp_path):
+    book, _ = imported(tmp_path, "full name,phone\n  Eve   Adams ,0501234567\n")
+    assert list(book) == ["Alice", "Bob", "Eve_Adams"]
@@ -0,0 +1,70 @@
+import os
+
+from classes import AddressBook
+from handlers import COMMANDS
+from journal import Journal
+
+HANDLERS = {name: command.handler for name, command in COMMANDS.items()}
+
+
+def run(book, journal, command, *args):
+    HANDLERS[command](list(args), book)
+    journal.append(book, command, list(args))
+
+
+def test_replay_restores_the_changes(tmp_path):
+    book = AddressBook()
+    journal = Journal(str(tmp_path / "book.journal"))
+    run(book, journal, "add", "Alice", "0501234567")
+    run(book, journal, "add-email", "Alice", "alice@example.com")
+    run(book, journal, "add", "Bob", "0670000000")
+    journal.close()
+
+    replayed = AddressBook()
+    assert Journal(journal.path).replay(replayed, HANDLERS) == 3
+    assert replayed.journal_seq == 3
+    assert list(replayed.record_payloads()) == list(book.record_payloads())
+
+
+def test_replay_skips_entries_in_the_snapshot_and_torn_lines(tmp_path):
+    snapshot_path = str(tmp_path / "book.json")
+    book = AddressBook()
+    journal = Journal(str(tmp_path / "book.journal"))
+    run(book, journal, "add", "Alice", "0501234567")
+    journal.save(book.record_payloads, book.journal_seq, snapshot_path)
+    # Crash before the journal was truncated, mid-write of the next entry
+    run(book, journal, "add", "Bob", "0670000000")
+    journal.close()
+    with open(journal.path, "a") as file:
+        file.write('{"seq": 3, "command": "add", "ar')
+
+    replayed = AddressBook()
+    replayed.from_json(snapshot_path)
+    assert Journal(journal.path).replay(replayed, HANDLERS) == 1
+    assert list(replayed) == ["Alice", "Bob"]
+    assert replayed.journal_seq == 2
+
+
+def test_closing_without_changes_leaves_the_snapshot_alone(tmp_path):
+    from main import Storage
+
+    snapshot_path = str(tmp_path / "book.json")
+    journal = Journal(str(tmp_path / "book.journal"))
+    book = AddressBook()
+    run(book, journal, "add", "Alice", "0501234567")
+    Storage(book, journal, snapshot_path).close()
+    with open(snapshot_path) as file:
+        saved = file.read()
+    os.utime(snapshot_path, (0, 0))
+
+    book = AddressBook()
+    book.from_json(snapshot_path, lazy=True)
+    HANDLERS["phone"](["Alice"], book)
+    Storage(book, Journal(journal.path), snapshot_path).close()
+    assert os.path.getmtime(snapshot_path) == 0
+    with open(snapshot_path) as file:
+        assert file.read() == saved
+
+    HANDLERS["add-email"](["Alice", "alice@example.com"], book)
+    Storage(book, Journal(journal.path), snapshot_path).close()
+    assert os.path.getmtime(snapshot_path) > 0
@@ -0,0 +1,46 @@
+import io
+import json
+
+import pytest
+
+from jsonstream import dump_records, iter_records
+
+DOCUMENTS = [
+    '{"records": [1.5e3, -12, 0.25, 1E-7, 3], "a": -12}',
+    '{"records": [{"name": "Ann", "n": 10, "x": [true, false, null]}], "seq": 123456}',
+    '{"a": 2.5e+10, "records": ["\\u00e9\\"\\\\", {}, []], "b": {"c": -0.0}}',
+    '  { "records" : [ ] , "journal_seq" : 7 }  ',
+    '{"records": [12345678901234567890, 1.0, -1e-3]}',
+    "{}",
+]
+
+
+def parse(text, chunk_size):
+    meta = {}
+    records = list(iter_records(io.StringIO(text), meta, chunk_size=chunk_size))
+    return records, meta
+
+
+@pytest.mark.parametrize("text", DOCUMENTS)
+def test_matches_json_loads_for_every_chunk_size(text):
+    expected = json.loads(text)
+    expected_records = expected.pop("records", [])
+    for chunk_size in range(1, len(text) + 2):
+        assert parse(text, chunk_size) == (expected_records, expected), chunk_size
+
+
+def test_round_trips_dump_records():
+    payloads = [
+        {"name": f"user{i}", "phones": [f"{i:010d}"], "weight": i / 7}
+        for i in range(50)
+    ]
+    file = io.StringIO()
+    dump_records(file, payloads, journal_seq=42)
+    for chunk_size in (1, 3, 5, 64, 1 << 16):
+        assert parse(file.getvalue(), chunk_size) == (payloads, {"journal_seq": 42})
+
+
+@pytest.mark.parametrize("text", ['{"records": [1,]}', '{"records": [1', "[1, 2]"])
+def test_rejects_malformed_documents(text):
+    with pytest.raises(ValueError):
+        parse(text, 2)
@@ -0,0 +1,12 @@
+import os
+
+from conftest import SRC
+from handlers import commands_markdown
+
+
+def test_readme_lists_every_registered_command():
+    with open(os.path.join(SRC, "..", "README.md")) as file:
+        readme = file.read()
+    listed = readme.split("<!-- commands:start -->\n")[1]
+    listed = listed.split("<!-- commands:end -->")[0]
+    assert listed == commands_markdown(), "stale: regenerate with python src/handlers.py"
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import socket
+
+import pytest
+
+from classes import AddressBook
+from journal import Journal
+from main import Storage
+from server import BookServer, parse_address
+from sqlite_book import SQLiteAddressBook
+
+
+def json_storage(tmp_path):
+    journal = Journal(str(tmp_path / "book.journal"))
+    return Storage(AddressBook(), journal, str(tmp_path / "book.json"))
+
+
+def sqlite_storage(tmp_path):
+    return Storage(SQLiteAddressBook(str(tmp_path / "book.db")), None, None)
+
+
+async def pipelined(storage, path, requests):
+    server = await asyncio.start_unix_server(BookServer(storage).handle_connection, path)
+    async with server:
+        reader, writer = await asyncio.open_unix_connection(path)
+        # Every request goes out before the first reply is read
+        writer.write(b"".join(json.dumps(r).encode() + b"\n" for r in requests))
+        await writer.drain()
+        responses = [json.loads(await reader.readline()) for _ in requests]
+        writer.close()
+        await writer.wait_closed()
+    return responses
+
+
+@pytest.mark.parametrize("make_storage", [json_storage, sqlite_storage])
+def test_pipelined_requests_are_answered_in_order(tmp_path, make_storage):
+    storage = make_storage(tmp_path)
+    requests = [
+        {"id": 1, "command": "add", "args": ["Alice", "0501234567"]},
+        {"id": 2, "command": "add", "args": ["Bob", "0670000000"]},
+        {"id": 3, "command": "phone", "args": ["Alice"]},
+        {"id": 4, "command": "find-phone", "args": ["0670000000"]},
+        {"id": 5, "command": "all"},
+        {"id": 6, "command": "nope"},
+        {"id": 7, "command": "add", "args": ["X", "bad"]},
+        {"id": 8, "command": "phone", "args": ["Zed"]},
+    ]
+    try:
+        responses = asyncio.run(
+            pipelined(storage, str(tmp_path / "book.sock"), requests)
+        )
+    finally:
+        storage.close()
+
+    assert [response["id"] for response in responses] == [1, 2, 3, 4, 5, 6, 7, 8]
+    assert [response["ok"] for response in responses] == [True] * 5 + [False] * 3
+    assert "Contact added." in responses[0]["output"]
+    assert responses[2]["output"] == "0501234567"
+    assert "Bob" in responses[3]["output"]
+    assert "Alice" in responses[4]["output"] and "Bob" in responses[4]["output"]
+    assert "Invalid name" in responses[6]["error"]
+    assert "Usage: command [arguments]" in responses[6]["error"]
+    assert "Contact not found." in responses[7]["error"]
+
+
+@pytest.mark.parametrize(
+    "address, expected",
+    [
+        ("127.0.0.1:8000", ("tcp", "127.0.0.1", 8000)),
+        ("localhost:8000", ("tcp", "localhost", 8000)),
+        ("[::1]:8000", ("tcp", "::1", 8000)),
+        (":8000", ("tcp", "127.0.0.1", 8000)),
+    ],
+)
+def test_parse_address_accepts_loopback(address, expected):
+    assert parse_address(address) == expected
+
+
+@pytest.mark.parametrize(
+    "address", ["0.0.0.0:8000", "192.168.1.10:8000", "example.com:8000", "[::]:80"]
+)
+def test_parse_address_refuses_other_hosts(address):
+    with pytest.raises(ValueError):
+        parse_address(address)
+
+
+def test_parse_address_refuses_paths_that_are_not_sockets(tmp_path):
+    path = tmp_path / "book.json"
+    path.write_text("[]")
+    with pytest.raises(ValueError):
+        parse_address(f"unix:{path}")
+    # Nothing there yet, or a stale socket: both fine
+    assert parse_address(f"unix:{tmp_path / 'new.sock'}") == (
+        "unix",
+        str(tmp_path / "new.sock"),
+    )
+    stale = socket.socket(socket.AF_UNIX)
+    stale.bind(str(tmp_path / "old.sock"))
+    stale.close()
+    assert parse_address(f"unix:{tmp_path / 'old.sock'}")[0] == "unix"
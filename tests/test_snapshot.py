@@ -0,0 +1,101 @@
+from classes import AddressBook, Record
+from snapshot import MappedAddressBook, Snapshot, write_snapshot
+
+
+def payload(name, phones, email=None):
+    return {
+        "name": name,
+        "phones": phones,
+        "email": email,
+        "address": None,
+        "birthday": None,
+        "notes": [{"id": 0, "content": f"about {name}", "tags": ["work"]}],
+    }
+
+
+PAYLOADS = [
+    payload("Carol", ["0500000003"], "carol@example.com"),
+    payload("Alice", ["0500000001", "0670000000"]),
+    payload("Bob", ["0670000000"], "bob@example.com"),
+]
+
+
+def test_snapshot_lookups(tmp_path):
+    path = str(tmp_path / "book.bin")
+    write_snapshot(PAYLOADS, path, journal_seq=17)
+    snapshot = Snapshot(path)
+
+    assert len(snapshot) == 3
+    assert snapshot.journal_seq == 17
+    assert list(snapshot.names()) == ["Carol", "Alice", "Bob"]
+    assert [snapshot.payload(n) for n in range(3)] == PAYLOADS
+    assert snapshot.find("Bob") == 2
+    assert snapshot.find("Bo") is None
+    assert snapshot.find("Zed") is None
+    assert list(snapshot.find_by_phone("0670000000")) == [1, 2]
+    assert list(snapshot.find_by_email("carol@example.com")) == [0]
+    assert list(snapshot.find_by_email("nobody@example.com")) == []
+    snapshot.close()
+
+
+def test_mapped_book_overlays_changes(tmp_path):
+    path = str(tmp_path / "book.bin")
+    write_snapshot(PAYLOADS, path)
+    book = MappedAddressBook(path)
+
+    assert book.find_by_phone("0500000003").name.value == "Carol"
+    book["Alice"].add_phone("0631111111")
+    book.delete("Bob")
+    record = Record("Dave")
+    record.add_phone("0639999999")
+    book.add_record(record)
+
+    assert list(book) == ["Carol", "Alice", "Dave"]
+    assert "Bob" not in book
+    assert book.find_by_phone("0631111111").name.value == "Alice"
+    assert book.find_by_email("bob@example.com") is None
+    assert [p["name"] for p in book.record_payloads()] == ["Carol", "Alice", "Dave"]
+    assert set(book.dirty) == {"Alice", "Bob", "Dave"}
+
+
+def test_round_trip_through_address_book(tmp_path):
+    path = str(tmp_path / "book.bin")
+    book = AddressBook()
+    for p in PAYLOADS:
+        book.add_record(book.record_from_dict(p))
+    write_snapshot(book.record_payloads(), path)
+
+    mapped = MappedAddressBook(path)
+    assert list(mapped.record_payloads()) == list(book.record_payloads())
+
+
+def test_birthdays_come_from_the_snapshot_without_hydrating(tmp_path):
+    path = str(tmp_path / "book.bin")
+    payloads = [dict(p) for p in PAYLOADS]
+    payloads[0]["birthday"] = "14.03.1990"
+    payloads[1]["birthday"] = "14.03.1985"
+    payloads[2]["birthday"] = "29.02.1992"
+    write_snapshot(payloads, path)
+    book = MappedAddressBook(path)
+
+    assert list(book.snapshot.find_by_birthday((3, 14))) == [0, 1]
+    assert book.birthdays_on([(3, 14)]) == ["Carol", "Alice"]
+    assert book.birthdays_on([(2, 28), (2, 29)]) == ["Bob"]
+    assert book.data == {}
+
+    book.delete("Carol")
+    book["Alice"].add_birthday("15.03.1985")
+    assert book.birthdays_on([(3, 14)]) == []
+    assert book.birthdays_on([(3, 15)]) == ["Alice"]
+
+
+def test_listing_a_mapped_book_does_not_hydrate_it(tmp_path):
+    from handlers import COMMANDS
+
+    path = str(tmp_path / "book.bin")
+    write_snapshot(PAYLOADS, path)
+    book = MappedAddressBook(path)
+
+    output = "".join(COMMANDS["all"].handler([], book))
+    assert "Name: Alice\nPhones: [0500000001, 0670000000]\n" in output
+    assert book.data == {} and book.superseded == set()
@@ -0,0 +1,56 @@
+import sqlite3
+
+from classes import Record
+from sqlite_book import SQLiteAddressBook
+
+
+def make_book(path):
+    book = SQLiteAddressBook(path)
+    for name, notes in [
+        ("Alice", ["call the plumber", "plumber plumber invoice"]),
+        ("Bob", ["birthday party", "plumbing is fine"]),
+    ]:
+        record = Record(name)
+        record.add_phone("0501234567")
+        for content in notes:
+            record.add_note(content)
+        book.add_record(record)
+    return book
+
+
+def found(book, *terms):
+    return [(record.name.value, note.id) for record, note in book.search_notes(terms)]
+
+
+def test_search_notes_matches_whole_tokens_best_first(tmp_path):
+    book = make_book(str(tmp_path / "book.db"))
+    assert found(book, "plumber") == [("Alice", 1), ("Alice", 0)]
+    assert sorted(found(book, "PARTY", "invoice")) == [("Alice", 1), ("Bob", 0)]
+    assert found(book, "nothing") == []
+
+
+def test_search_notes_follows_edits_and_deletes(tmp_path):
+    book = make_book(str(tmp_path / "book.db"))
+    book["Alice"].edit_note_by_id(0, ["call", "the", "electrician"])
+    assert found(book, "electrician") == [("Alice", 0)]
+    assert found(book, "plumber") == [("Alice", 1)]
+
+    book["Bob"].delete_note_by_id(0)
+    assert found(book, "party") == []
+    book.delete("Alice")
+    assert found(book, "plumber", "electrician") == []
+    # Raises if the index disagrees with the notes table
+    book.connection.execute(
+        "INSERT INTO notes_fts(notes_fts, rank) VALUES ('integrity-check', 1)"
+    )
+
+
+def test_existing_database_gets_its_notes_indexed(tmp_path):
+    path = str(tmp_path / "book.db")
+    make_book(path).close()
+    connection = sqlite3.connect(path)
+    connection.execute("DROP TABLE notes_fts")
+    connection.commit()
+    connection.close()
+
+    assert found(SQLiteAddressBook(path), "party") == [("Bob", 0)]